@@ -6,21 +6,509 @@ para renovación o obtención de licencias de conducir.
 """
 
 import asyncio
+import functools
+import importlib
+import inspect
+import json
 import time
 import logging
+import logging.handlers
+import random
 import re
+import signal
+import sys
+import threading
+from collections import Counter
 from datetime import datetime
-from typing import Optional, Dict, Any
+from itertools import cycle
+from typing import Optional, Dict, Any, List, Tuple
 import os
+import requests
 from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+
+class _InspectSinPila:
+    """
+    Sustituto del módulo ``inspect`` para los módulos internos de Playwright.
+    
+    Playwright llama a ``inspect.stack()`` en cada llamada a su API solo para
+    enriquecer los mensajes de error; recorrer la pila completa consume buena
+    parte del CPU del scraper. El resto de atributos se delega al módulo real.
+    """
+    
+    @staticmethod
+    def stack(*args, **kwargs):
+        return []
+        
+    def __getattr__(self, name):
+        return getattr(inspect, name)
+
+
+def _disable_playwright_stack_capture():
+    """Evita la captura de la pila en Playwright (desactivar con PW_INSPECT_STACK=1)."""
+    for module_name in (
+        'playwright._impl._api_types',
+        'playwright._impl._impl_to_api_mapping',
+        'playwright._impl._connection',
+    ):
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            # El módulo no existe en esta versión de Playwright
+            continue
+        if hasattr(module, 'inspect'):
+            module.inspect = _InspectSinPila()
+
+
+if os.getenv('PW_INSPECT_STACK', '0') == '0':
+    _disable_playwright_stack_capture()
+
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from colorama import init, Fore, Style, Back
 
 # Inicializar colorama para colores en Windows
 init(autoreset=True)
 
-# Cargar variables de entorno
-load_dotenv()
+_RESET = Style.RESET_ALL
+
+# Formato de RUT: 7-8 dígitos + guión + dígito verificador
+_RUT_RE = re.compile(r'^\d{7,8}-[\dK]$')
+
+# Patrones de mensajes de error del sitio (sobre el texto visible de la página),
+# compilados en una sola alternancia
+_ERROR_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in (
+    r'Atención!\s*Error:.*$',
+    r'Error:.*$',
+    r'ud\. ha excedido el tiempo máximo de espera',
+    r'tiempo máximo de espera',
+    r'no existen horas disponibles',
+    r'sin disponibilidad',
+    r'agendas llenas',
+    r'Buscando especialidades\.\.\.\.'
+)), re.IGNORECASE | re.MULTILINE)
+
+# Categorías de un mensaje de error, en orden de prioridad (el timeout gana aunque
+# aparezca después en el texto); el nombre es el 'status' del resultado
+_ERROR_KINDS = (
+    ('timeout_error', re.compile(r'tiempo máximo de espera|excedido', re.IGNORECASE)),
+    ('no_availability_error', re.compile(r'no existen horas|sin disponibilidad', re.IGNORECASE)),
+)
+
+# Palabras clave (en minúsculas) que indican falta de disponibilidad
+_NO_AVAILABILITY_KEYWORDS = (
+    'no existen horas disponibles',
+    'sin disponibilidad',
+    'no hay citas',
+    'agendas llenas',
+    'sin cupos',
+    'ud. ha excedido el tiempo máximo de espera',
+    'tiempo máximo de espera'
+)
+
+# Mensaje más frecuente en monitoreo continuo: se busca solo antes del escaneo general
+_HOT_NO_AVAILABILITY_KEYWORD = _NO_AVAILABILITY_KEYWORDS[0]
+
+# Palabras clave (en minúsculas) que indican disponibilidad
+_AVAILABILITY_KEYWORDS = (
+    'seleccione fecha',
+    'horarios disponibles',
+    'agendar cita',
+    'reservar hora'
+)
+
+# Texto visible de la página en minúsculas (la conversión se hace en el navegador).
+# Se limita a los primeros 64 KB: los mensajes y controles que interesan están al
+# inicio, y así una página enorme no se transfiere ni se copia entera en Python
+_PAGE_TEXT_MAX_CHARS = 65536
+_PAGE_TEXT_JS = f"() => (document.body.innerText || '').slice(0, {_PAGE_TEXT_MAX_CHARS})"
+_PAGE_TEXT_LOWER_JS = f"() => (document.body.innerText || '').slice(0, {_PAGE_TEXT_MAX_CHARS}).toLowerCase()"
+
+# Elementos que indican que se llegó al paso de selección de fecha/hora
+_NEXT_STEP_SELECTORS = (
+    'select[name*="fecha"]',
+    'input[type="date"]',
+    '.calendar',
+    '#calendario',
+    'select[name*="hora"]'
+)
+
+# Devuelve el primer selector de la lista que tiene coincidencias en la página, o null
+_FIRST_MATCHING_SELECTOR_JS = "(sels) => sels.find(s => document.querySelector(s)) || null"
+
+# Ambas listas compiladas en una sola alternancia: una sola pasada por el contenido
+# en lugar de una búsqueda por palabra clave. El grupo indica la lista.
+_AVAILABILITY_KEYWORD_RE = re.compile(
+    '(?P<no_availability>' + '|'.join(map(re.escape, _NO_AVAILABILITY_KEYWORDS)) + ')'
+    '|(?P<availability>' + '|'.join(map(re.escape, _AVAILABILITY_KEYWORDS)) + ')'
+)
+
+# Elementos que suelen contener mensajes de error
+_ERROR_ELEMENTS_SELECTOR = ', '.join((
+    '.error',
+    '.alert',
+    '.warning',
+    '[class*="error"]',
+    '[class*="alert"]',
+    'div[style*="color:red"]',
+    'div[style*="color: red"]',
+    'span[style*="color:red"]',
+    'span[style*="color: red"]'
+))
+
+# Argumentos de lanzamiento del navegador (anti-detección y sin autocompletado)
+_CHROMIUM_ARGS = (
+    '--no-sandbox',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor',
+    '--incognito',  # Modo incógnito
+    '--disable-save-password-bubble',  # No guardar contraseñas
+    '--disable-autofill',  # Deshabilitar autocompletado
+    '--disable-autofill-keyboard-accessory-view',
+    '--disable-full-form-autofill-ios',
+    '--disable-password-generation',
+    '--disable-password-manager',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--disable-dev-shm-usage',
+    '--disable-gpu-sandbox',
+    '--disable-software-rasterizer',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-ipc-flooding-protection',
+    '--disable-hang-monitor',
+    '--disable-client-side-phishing-detection',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-domain-reliability',
+    '--disable-component-extensions-with-background-pages',
+)
+
+# Opciones de cada contexto de navegación
+_CONTEXT_KWARGS = dict(
+    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    viewport={'width': 1366, 'height': 768},
+    locale='es-CL',
+    # Configuraciones para evitar cache y datos guardados
+    ignore_https_errors=True,
+    java_script_enabled=True,
+    # No permitir que se guarde información
+    storage_state=None,  # No cargar estado previo
+    # Configuraciones adicionales de privacidad
+    permissions=[],  # Sin permisos especiales
+    extra_http_headers={
+        'Cache-Control': 'no-cache, no-store, must-revalidate',
+        'Pragma': 'no-cache',
+        'Expires': '0'
+    }
+)
+
+# Recursos que no se descargan. Las hojas de estilo se mantienen porque la
+# detección de modales depende de los estilos calculados de cada elemento.
+_BLOCKED_RESOURCE_TYPES = frozenset(('image', 'font', 'media'))
+
+# Servicios de analítica/publicidad que se bloquean siempre
+_BLOCKED_HOSTS_RE = re.compile(r'^https?://([^/]*\.)?(google-analytics\.com|googletagmanager\.com|doubleclick\.net)[:/]')
+
+# Limpia localStorage, sessionStorage, IndexedDB, WebSQL, Application Cache y
+# los campos de formulario autollenados, en un solo viaje al navegador
+_CLEAR_STORAGE_JS = """
+    async () => {
+        // Limpiar localStorage y sessionStorage
+        try { localStorage.clear(); } catch(e) {}
+        try { sessionStorage.clear(); } catch(e) {}
+        
+        // Limpiar IndexedDB
+        try {
+            if ('indexedDB' in window) {
+                const databases = await indexedDB.databases();
+                await Promise.all(databases.map(db => {
+                    return new Promise((resolve, reject) => {
+                        const deleteReq = indexedDB.deleteDatabase(db.name);
+                        deleteReq.onsuccess = () => resolve();
+                        deleteReq.onerror = () => resolve(); // No fallar si no se puede
+                    });
+                }));
+            }
+        } catch(e) {
+            console.log('Error clearing IndexedDB:', e);
+        }
+        
+        // Limpiar WebSQL (si está disponible)
+        try {
+            if ('openDatabase' in window) {
+                const db = openDatabase('', '', '', '');
+                if (db) {
+                    db.transaction(tx => {
+                        tx.executeSql('DELETE FROM data', [], () => {}, () => {});
+                    });
+                }
+            }
+        } catch(e) {
+            console.log('Error clearing WebSQL:', e);
+        }
+        
+        // Limpiar Application Cache
+        try {
+            if ('applicationCache' in window && window.applicationCache) {
+                window.applicationCache.swapCache();
+            }
+        } catch(e) {
+            console.log('Error clearing Application Cache:', e);
+        }
+        
+        // Limpiar cualquier formulario autollenado
+        try {
+            const inputs = document.querySelectorAll('input[type="text"], input[type="email"], input[type="tel"]');
+            inputs.forEach(input => {
+                input.value = '';
+                input.dispatchEvent(new Event('input', { bubbles: true }));
+                input.dispatchEvent(new Event('change', { bubbles: true }));
+            });
+        } catch(e) {
+            console.log('Error clearing form fields:', e);
+        }
+    }
+"""
+
+# Páginas del flujo en las que hay que buscar el botón de especialidades
+_URL_RE = re.compile(r'(paso-1|estatus)\.aspx')
+
+# Campo de RUT del formulario inicial
+_RUT_INPUT_SELECTOR = 'input[name="txtRut"], #txtRut'
+
+# Vacía un campo de texto y notifica el cambio a los scripts de la página
+_RESET_INPUT_JS = """
+    (element) => {
+        element.value = '';
+        element.dispatchEvent(new Event('input', { bubbles: true }));
+        element.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+"""
+
+# Se cumple cuando ya no queda ningún modal visible en la página (visibilidad real
+# según el estilo calculado, igual que al detectar modales: los diálogos de
+# Bootstrap siguen en el DOM ocultos por CSS, sin el atributo hidden)
+_NO_OPEN_MODAL_JS = """
+    () => !Array.from(document.querySelectorAll('.modal.show, [role=dialog]')).some(element => {
+        const style = window.getComputedStyle(element);
+        return style.display !== 'none' &&
+               style.visibility !== 'hidden' &&
+               style.opacity !== '0' &&
+               element.offsetHeight > 0 &&
+               element.offsetWidth > 0;
+    })
+"""
+
+# Espera entre reintentos del botón de especialidades (segundos): crece de forma
+# exponencial mientras no haya avances y vuelve al inicio cuando los hay
+_RETRY_BACKOFF_INITIAL = 0.5
+_RETRY_BACKOFF_MAX = 30
+_RETRY_BACKOFF_JITTER = 0.25
+
+# Limpiezas rápidas del contexto fallidas seguidas antes de recrearlo por completo
+_SOFT_RESET_MAX_FAILURES = 3
+
+# Botón de especialidades que mencionó el usuario
+_ESPECIALIDAD_BUTTON_SELECTOR = '#dgGrilla_btIngresar_0'
+
+# El botón principal y sus alternativas en un solo selector CSS: si el principal no
+# aparece, un locator espera a cualquier alternativa de una vez en lugar de probarlas una por una
+_ESPECIALIDAD_BUTTON_ANY_SELECTOR = ', '.join((
+    _ESPECIALIDAD_BUTTON_SELECTOR,
+    'input[name="dgGrilla$ctl02$btIngresar"]',
+    'input.BotonIngresar',
+    'table input[id*="btIngresar"]',
+))
+
+# Solo coincidencias visibles: una alternativa oculta antes en el DOM no debe ganar
+_ESPECIALIDAD_BUTTON_VISIBLE_SELECTOR = f'{_ESPECIALIDAD_BUTTON_ANY_SELECTOR} >> visible=true'
+
+# Se cumple cuando estatus.aspx ya no muestra "Buscando especialidades"
+_SPECIALTIES_LOADED_JS = "() => !(document.body.innerText || '').toLowerCase().includes('buscando especialidades')"
+
+# Análisis completo de estatus.aspx (tablas, botones y errores) en una sola llamada
+# al navegador
+_ESTATUS_PAGE_JS = """
+    () => {
+        const tables = document.querySelectorAll('table');
+        let info = {
+            hasTable: false,
+            hasModifyColumn: false,
+            hasButtons: false,
+            specialties: [],
+            errors: []
+        };
+
+        // Buscar errores visibles
+        const errorElements = document.querySelectorAll('b, span, div');
+        errorElements.forEach(el => {
+            const text = el.textContent || el.innerText || '';
+            if (text.includes('Error:') || text.includes('Atención!')) {
+                info.errors.push(text.trim());
+            }
+        });
+
+        // Analizar tablas
+        tables.forEach(table => {
+            const headers = Array.from(table.querySelectorAll('th')).map(th => th.textContent.trim());
+            const hasModify = headers.some(h => h.toLowerCase().includes('modificar'));
+
+            if (headers.length > 0) {
+                info.hasTable = true;
+                if (hasModify) {
+                    info.hasModifyColumn = true;
+                }
+
+                // Buscar botones en la tabla
+                const buttons = Array.from(table.querySelectorAll('input[type="submit"]'));
+                if (buttons.length > 0) {
+                    info.hasButtons = true;
+                    buttons.forEach(btn => {
+                        const row = btn.closest('tr');
+                        if (row) {
+                            const cells = Array.from(row.querySelectorAll('td')).map(td => td.textContent.trim());
+                            info.specialties.push({
+                                id: btn.id || btn.name || 'sin-id',
+                                cells: cells
+                            });
+                        }
+                    });
+                }
+            }
+        });
+
+        return info;
+    }
+"""
+
+# Selectores de modales/popups, en orden de prioridad
+_MODAL_SELECTORS = (
+    # Modales comunes
+    '.modal',
+    '.popup',
+    '.dialog',
+    '.alert',
+    '[role="dialog"]',
+    '[role="alertdialog"]',
+
+    # Modales Bootstrap
+    '.modal.show',
+    '.modal.fade.show',
+
+    # Modales con overlay
+    '.modal-backdrop',
+    '.overlay',
+
+    # Alertas del navegador (pueden aparecer como elementos DOM)
+    '.alert-dialog',
+    '.swal-modal',
+    '.sweetalert-modal',
+)
+
+# Modales abiertos según marcadores explícitos: tienen prioridad sobre la búsqueda amplia
+_PRECISE_MODAL_SELECTOR = 'dialog[open], [role="dialog"][aria-hidden="false"], .modal.show'
+
+# Selectores que se consultan de una vez; el índice 0 (el preciso) gana sobre el resto
+_MODAL_QUERY_SELECTORS = (_PRECISE_MODAL_SELECTOR,) + _MODAL_SELECTORS
+
+# Botones de cerrar dentro de un modal, en orden de prioridad
+_MODAL_CLOSE_SELECTORS = (
+    'button[data-dismiss="modal"]',
+    '.close',
+    '.btn-close',
+    '.modal-close',
+    'button.close',
+    '[aria-label="Close"]',
+    '[aria-label="Cerrar"]',
+    '.fa-times',
+    '.fa-close',
+)
+
+# Hace clic en el primer botón de cerrar del modal: por selector y, si no hay,
+# por el texto del botón. Devuelve lo que se usó, o null si no había botón
+_CLICK_MODAL_CLOSE_JS = """
+    (element, selectors) => {
+        for (const selector of selectors) {
+            const button = element.querySelector(selector);
+            if (button) {
+                button.click();
+                return selector;
+            }
+        }
+        const button = Array.from(element.querySelectorAll('button'))
+            .find(b => /×|Cerrar|OK|Aceptar/.test(b.textContent || ''));
+        if (button) {
+            button.click();
+            return `button con texto "${button.textContent.trim()}"`;
+        }
+        return null;
+    }
+"""
+
+# Deja solo los selectores que el motor del navegador acepta: uno inválido haría
+# fallar la consulta combinada de todos los modales
+_VALID_SELECTORS_JS = """
+    (selectors) => selectors.filter(selector => {
+        try {
+            document.querySelector(selector);
+            return true;
+        } catch (e) {
+            return false;
+        }
+    })
+"""
+
+# Para cada elemento encontrado, índice del primer selector de modal que cumple si
+# el elemento está visible, o -1 si está oculto (una sola llamada para todos)
+_MODAL_VISIBILITY_JS = """
+    ([elements, selectors]) => elements.map(element => {
+        const style = window.getComputedStyle(element);
+        const visible = style.display !== 'none' &&
+                        style.visibility !== 'hidden' &&
+                        style.opacity !== '0' &&
+                        element.offsetHeight > 0 &&
+                        element.offsetWidth > 0;
+        return visible ? selectors.findIndex(selector => {
+            try {
+                return element.matches(selector);
+            } catch (e) {
+                return false;
+            }
+        }) : -1;
+    })
+"""
+
+# Funciones de análisis registradas una sola vez por contexto (add_init_script) bajo
+# un Symbol no enumerable de window (los scripts de la página no lo ven al recorrer
+# sus propiedades): cada llamada posterior envía solo una invocación corta en lugar
+# del código completo
+_SCRAPER_SYMBOL_JS = "Symbol.for('licencia_scraper')"
+_SCRAPER_INIT_JS = (
+    "(() => {\n"
+    "    const modalSelectors = " + json.dumps(_MODAL_QUERY_SELECTORS) + ";\n"
+    "    const closeSelectors = " + json.dumps(_MODAL_CLOSE_SELECTORS) + ";\n"
+    "    const scanEstatus = " + _ESTATUS_PAGE_JS.strip() + ";\n"
+    "    const modalVisibility = " + _MODAL_VISIBILITY_JS.strip() + ";\n"
+    "    const clickModalClose = " + _CLICK_MODAL_CLOSE_JS.strip() + ";\n"
+    "    Object.defineProperty(window, " + _SCRAPER_SYMBOL_JS + ", {\n"
+    "        value: Object.freeze({\n"
+    "            scanEstatus,\n"
+    "            modalVisibility: elements => modalVisibility([elements, modalSelectors]),\n"
+    "            clickModalClose: element => clickModalClose(element, closeSelectors),\n"
+    "        }),\n"
+    "        enumerable: false,\n"
+    "    });\n"
+    "})();\n"
+)
+_SCAN_ESTATUS_CALL_JS = f"() => window[{_SCRAPER_SYMBOL_JS}].scanEstatus()"
+_MODAL_VISIBILITY_CALL_JS = f"(elements) => window[{_SCRAPER_SYMBOL_JS}].modalVisibility(elements)"
+_CLICK_MODAL_CLOSE_CALL_JS = f"(element) => window[{_SCRAPER_SYMBOL_JS}].clickModalClose(element)"
 
 class LicenciaScraper:
     """
@@ -35,36 +523,71 @@ class LicenciaScraper:
         # URLs y patrones de configuración
         self.target_url = os.getenv('TARGET_URL', 'https://tramites.munistgo.cl/reservahoralicencia/')
         self.error_url_pattern = os.getenv('ERROR_URL_PATTERN', 'paso-1.aspx?Error=No%20existen%20horas%20disponibles')
+        self._error_url_re = re.compile(re.escape(self.error_url_pattern))
+        
+        # Clasificación de URLs memorizada: los reintentos vuelven a las mismas URLs
+        self._classify_url = functools.lru_cache(maxsize=256)(self._classify_url_impl)
         
         # Configuraciones de tiempo y comportamiento
         self.retry_interval = int(os.getenv('RETRY_INTERVAL_MINUTES', '30'))
         self.rut_ejemplo = os.getenv('RUT_EJEMPLO', '25334838-0')
         self.headless_mode = os.getenv('HEADLESS_MODE', 'False').lower() == 'true'
         self.browser_type = os.getenv('BROWSER_TYPE', 'chromium')
+        self.block_resources = os.getenv('BLOCK_RESOURCES', 'True').lower() == 'true'
+        self.capture_screenshots = os.getenv('DEBUG_SCREENSHOTS', '0') == '1'
+        self.http_precheck = os.getenv('HTTP_PRECHECK', 'True').lower() == 'true'
+        self._http: Optional[requests.Session] = None
+        self._screenshot_tasks = set()
         
         # Variables de estado
+        self.playwright = None
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.attempt_count = 0
+        self._soft_reset_failures = 0
+        
+        # Selectores de modales válidos, unidos en uno solo (se validan la primera vez)
+        self._modal_selector: Optional[str] = None
+        
+        # Veces que se detectó cada palabra clave de disponibilidad (se registra al cerrar)
+        self._kw_hits: Counter = Counter()
         
         # Variables de configuración del usuario
         self.user_rut: Optional[str] = None
         self.operation_type: Optional[str] = None  # 'crear' o 'modificar'
         
+        # Prefijos ANSI (estilo + color) precalculados para print_colored
+        self._ansi = {
+            (color, style): f"{style}{color}"
+            for color in (Fore.WHITE, Fore.CYAN, Fore.BLUE, Fore.GREEN, Fore.RED, Fore.YELLOW, Fore.MAGENTA)
+            for style in (Style.NORMAL, Style.BRIGHT)
+        }
+        
         # Configurar logging
         self._setup_logging()
         
+        # Diagnósticos extra (solo con LOG_LEVEL=DEBUG)
+        self.debug = self.logger.isEnabledFor(logging.DEBUG)
+        self._log_debug = self.logger.debug
+        
     def _setup_logging(self):
         """Configura el sistema de logging para registrar todas las actividades."""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('licencia_scraper.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # Configurar solo una vez por proceso: crear otra instancia del scraper
+        # no debe abrir otro archivo de log
+        if not logging.getLogger().handlers:
+            logging.basicConfig(
+                level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
+                format='%(asctime)s - %(levelname)s - %(message)s',
+                handlers=[
+                    # Rotar el log para que no crezca sin límite en monitoreos largos
+                    logging.handlers.RotatingFileHandler(
+                        'licencia_scraper.log', maxBytes=5_000_000, backupCount=3,
+                        encoding='utf-8', delay=True
+                    ),
+                    logging.StreamHandler()
+                ]
+            )
         self.logger = logging.getLogger(__name__)
         
     def _validate_rut(self, rut: str) -> bool:
@@ -77,27 +600,19 @@ class LicenciaScraper:
         Returns:
             True si el formato es válido, False en caso contrario.
         """
-        import re
-        
         # Remover espacios y convertir a mayúsculas
         rut = rut.replace(" ", "").replace(".", "").upper()
         
         # Verificar formato básico: 7-8 dígitos + guión + dígito verificador
-        if not re.match(r'^\d{7,8}-[\dK]$', rut):
+        if not _RUT_RE.match(rut):
             return False
             
         # Separar número y dígito verificador
         numero, dv = rut.split('-')
         
-        # Calcular dígito verificador
-        suma = 0
-        multiplicador = 2
-        
-        for digit in reversed(numero):
-            suma += int(digit) * multiplicador
-            multiplicador += 1
-            if multiplicador > 7:
-                multiplicador = 2
+        # Calcular dígito verificador (multiplicadores 2..7 en ciclo desde la derecha)
+        suma = sum(int(digit) * multiplicador
+                   for digit, multiplicador in zip(reversed(numero), cycle((2, 3, 4, 5, 6, 7))))
                 
         resto = suma % 11
         dv_calculado = 11 - resto
@@ -183,94 +698,29 @@ class LicenciaScraper:
         self.print_colored(f"Operación: {self.operation_type.title()}", Fore.WHITE)
         self.print_colored(f"{'-':^60}", Fore.CYAN)
         
-    async def _clear_browser_data(self):
-        """Limpia todos los datos del navegador para evitar cache de forma agresiva."""
+    async def _soft_reset_context(self):
+        """
+        Deja limpio el contexto actual sin cerrarlo: borra cookies, permisos y
+        almacenamiento de la página. Solo si falla varias veces seguidas se recrea
+        el contexto completo.
+        """
         try:
-            if self.page:
-                self.print_colored("🧹 Iniciando limpieza agresiva del navegador...", Fore.YELLOW)
-                
-                # Limpiar localStorage
-                await self.page.evaluate("() => { try { localStorage.clear(); } catch(e) {} }")
-                
-                # Limpiar sessionStorage
-                await self.page.evaluate("() => { try { sessionStorage.clear(); } catch(e) {} }")
-                
-                # Limpiar IndexedDB
-                await self.page.evaluate("""
-                    async () => {
-                        try {
-                            if ('indexedDB' in window) {
-                                const databases = await indexedDB.databases();
-                                await Promise.all(databases.map(db => {
-                                    return new Promise((resolve, reject) => {
-                                        const deleteReq = indexedDB.deleteDatabase(db.name);
-                                        deleteReq.onsuccess = () => resolve();
-                                        deleteReq.onerror = () => resolve(); // No fallar si no se puede
-                                    });
-                                }));
-                            }
-                        } catch(e) {
-                            console.log('Error clearing IndexedDB:', e);
-                        }
-                    }
-                """)
-                
-                # Limpiar WebSQL (si está disponible)
-                await self.page.evaluate("""
-                    () => {
-                        try {
-                            if ('openDatabase' in window) {
-                                const db = openDatabase('', '', '', '');
-                                if (db) {
-                                    db.transaction(tx => {
-                                        tx.executeSql('DELETE FROM data', [], () => {}, () => {});
-                                    });
-                                }
-                            }
-                        } catch(e) {
-                            console.log('Error clearing WebSQL:', e);
-                        }
-                    }
-                """)
-                
-                # Limpiar Application Cache
-                await self.page.evaluate("""
-                    () => {
-                        try {
-                            if ('applicationCache' in window && window.applicationCache) {
-                                window.applicationCache.swapCache();
-                            }
-                        } catch(e) {
-                            console.log('Error clearing Application Cache:', e);
-                        }
-                    }
-                """)
-                
-                # Limpiar cookies del contexto
-                await self.context.clear_cookies()
-                
-                # Limpiar cualquier formulario autollenado
-                await self.page.evaluate("""
-                    () => {
-                        try {
-                            // Limpiar todos los campos de input
-                            const inputs = document.querySelectorAll('input[type="text"], input[type="email"], input[type="tel"]');
-                            inputs.forEach(input => {
-                                input.value = '';
-                                input.dispatchEvent(new Event('input', { bubbles: true }));
-                                input.dispatchEvent(new Event('change', { bubbles: true }));
-                            });
-                        } catch(e) {
-                            console.log('Error clearing form fields:', e);
-                        }
-                    }
-                """)
-                
-                self.print_colored("✅ Limpieza agresiva del navegador completada", Fore.GREEN)
-                
+            await asyncio.gather(
+                self.context.clear_cookies(),
+                self.context.clear_permissions(),
+                self.page.evaluate(_CLEAR_STORAGE_JS)
+            )
+            self._soft_reset_failures = 0
+            self.print_colored("🧹 Contexto del navegador limpiado", Fore.GREEN)
+            
         except Exception as e:
-            self.print_colored(f"⚠️ Error al limpiar datos del navegador: {str(e)}", Fore.YELLOW)
-            # No es crítico, continuar
+            self._soft_reset_failures += 1
+            self.print_colored(f"⚠️ Error al limpiar el contexto ({self._soft_reset_failures}/{_SOFT_RESET_MAX_FAILURES}): {str(e)}", Fore.YELLOW)
+            
+            if self._soft_reset_failures >= _SOFT_RESET_MAX_FAILURES:
+                self._soft_reset_failures = 0
+                self.print_colored("🔄 Recreando contexto del navegador...", Fore.YELLOW)
+                await self._new_context()
         
     def print_colored(self, message: str, color: str = Fore.WHITE, style: str = Style.NORMAL):
         """
@@ -281,7 +731,48 @@ class LicenciaScraper:
             color: Color del texto (usando colorama)
             style: Estilo del texto (normal, bright, etc.)
         """
-        print(f"{style}{color}{message}{Style.RESET_ALL}")
+        prefix = self._ansi.get((color, style))
+        if prefix is None:
+            prefix = self._ansi[(color, style)] = f"{style}{color}"
+        sys.stdout.write(prefix + message + _RESET + '\n')
+        
+    def _batch_print(self, lines: List[Tuple[str, ...]]):
+        """
+        Imprime varias líneas con colores en una sola escritura a stdout.
+        
+        Args:
+            lines: Tuplas (mensaje, color) o (mensaje, color, estilo)
+        """
+        parts = []
+        for message, color, *style in lines:
+            key = (color, style[0] if style else Style.NORMAL)
+            prefix = self._ansi.get(key)
+            if prefix is None:
+                prefix = self._ansi[key] = f"{key[1]}{key[0]}"
+            parts.append(prefix + message + _RESET + '\n')
+        sys.stdout.write(''.join(parts))
+        
+    def _print_error_report(self, error_info: Dict[str, Any], title: str, color: str):
+        """
+        Muestra el resumen de un error (tipo, mensaje, URL y errores detectados).
+        
+        Args:
+            error_info: Información del error detectado
+            title: Título del recuadro
+            color: Color del título y los separadores
+        """
+        lines = [
+            (f"\n{title:^60}", color, Style.BRIGHT),
+            ("=" * 60, color),
+            (f"📋 Tipo de error: {error_info.get('status', 'Desconocido')}", Fore.YELLOW),
+            (f"📝 Mensaje: {error_info.get('message', 'Sin mensaje')}", Fore.YELLOW),
+            (f"🔗 URL actual: {error_info.get('url', 'Desconocida')}", Fore.YELLOW),
+        ]
+        if error_info.get('all_errors'):
+            lines.append(("📄 Errores detectados:", Fore.YELLOW))
+            lines.extend((f"   {i}. {error}", Fore.RED) for i, error in enumerate(error_info['all_errors'], 1))
+        lines.append(("=" * 60, color))
+        self._batch_print(lines)
         
     def print_step(self, step_number: int, description: str):
         """
@@ -291,9 +782,11 @@ class LicenciaScraper:
             step_number: Número del paso
             description: Descripción del paso
         """
-        self.print_colored(f"\n{'='*60}", Fore.CYAN)
-        self.print_colored(f"PASO {step_number}: {description}", Fore.CYAN, Style.BRIGHT)
-        self.print_colored(f"{'='*60}", Fore.CYAN)
+        self._batch_print([
+            (f"\n{'='*60}", Fore.CYAN),
+            (f"PASO {step_number}: {description}", Fore.CYAN, Style.BRIGHT),
+            (f"{'='*60}", Fore.CYAN),
+        ])
         
     async def initialize_browser(self):
         """
@@ -305,8 +798,17 @@ class LicenciaScraper:
         self.print_step(1, "Inicializando navegador")
         
         try:
+            # El navegador se lanza una sola vez y se reutiliza entre intentos;
+            # en cada intento solo se crea un contexto nuevo (mucho más barato)
+            if self.browser and self.browser.is_connected():
+                self.print_colored("🔄 Reutilizando navegador existente", Fore.GREEN)
+                await self._new_context()
+                self.print_colored("✅ Navegador inicializado correctamente", Fore.GREEN)
+                return
+            
             # Crear instancia de Playwright
-            self.playwright = await async_playwright().start()
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
             
             # Seleccionar tipo de navegador
             if self.browser_type.lower() == 'firefox':
@@ -318,69 +820,13 @@ class LicenciaScraper:
                 
             self.print_colored(f"🌐 Lanzando navegador: {self.browser_type}", Fore.BLUE)
             
-            # Configurar opciones del navegador
-            browser_options = {
-                'headless': self.headless_mode,
-                'args': [
-                    '--no-sandbox',
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor',
-                    '--incognito',  # Modo incógnito
-                    '--disable-save-password-bubble',  # No guardar contraseñas
-                    '--disable-autofill',  # Deshabilitar autocompletado
-                    '--disable-autofill-keyboard-accessory-view',
-                    '--disable-full-form-autofill-ios',
-                    '--disable-password-generation',
-                    '--disable-password-manager',
-                    '--no-first-run',
-                    '--no-default-browser-check',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu-sandbox',
-                    '--disable-software-rasterizer',
-                    '--disable-background-timer-throttling',
-                    '--disable-renderer-backgrounding',
-                    '--disable-backgrounding-occluded-windows',
-                    '--disable-ipc-flooding-protection',
-                    '--disable-hang-monitor',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-domain-reliability',
-                    '--disable-component-extensions-with-background-pages'
-                ]
-            }
-            
-            # Lanzar navegador
-            self.browser = await browser_launcher.launch(**browser_options)
-            
-            # Crear contexto con configuraciones para evitar cache
-            self.context = await self.browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1366, 'height': 768},
-                locale='es-CL',
-                # Configuraciones para evitar cache y datos guardados
-                ignore_https_errors=True,
-                java_script_enabled=True,
-                # No permitir que se guarde información
-                storage_state=None,  # No cargar estado previo
-                # Configuraciones adicionales de privacidad
-                permissions=[],  # Sin permisos especiales
-                extra_http_headers={
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            )
-            
-            # Crear nueva página
-            self.page = await self.context.new_page()
-            
-            # Limpiar cualquier dato cacheado
-            await self._clear_browser_data()
+            # Lanzar navegador (los contexto/página anteriores, si existían, murieron con él)
+            self.browser = await browser_launcher.launch(headless=self.headless_mode, args=list(_CHROMIUM_ARGS))
+            self.context = None
+            self.page = None
             
-            # Configurar timeouts
-            self.page.set_default_timeout(30000)  # 30 segundos
+            # Crear contexto y página
+            await self._new_context()
             
             self.print_colored("✅ Navegador inicializado correctamente", Fore.GREEN)
             self.logger.info("Navegador inicializado correctamente")
@@ -390,6 +836,104 @@ class LicenciaScraper:
             self.logger.error(f"Error al inicializar navegador: {str(e)}")
             raise
             
+    async def _new_context(self):
+        """
+        Crea un contexto de navegación limpio (y su página) sobre el navegador actual.
+        
+        Si ya existía un contexto, se cierra antes de crear el nuevo.
+        """
+        # Cerrar página y contexto actuales
+        if self.page:
+            await self.page.close()
+            self.page = None
+        if self.context:
+            await self.context.close()
+            
+        # Crear contexto con configuraciones para evitar cache
+        self.context = await self.browser.new_context(**_CONTEXT_KWARGS)
+        
+        # Registrar las funciones de análisis en todas las páginas del contexto
+        await self.context.add_init_script(_SCRAPER_INIT_JS)
+        
+        # Bloquear recursos que el scraper no necesita (imágenes, fuentes, analítica)
+        if self.block_resources:
+            await self.context.route('**/*', self._route_request)
+        
+        # Crear nueva página (un contexto recién creado ya está limpio: no hace
+        # falta borrar cookies ni almacenamiento)
+        await self._fresh_page()
+        
+    async def _fresh_page(self):
+        """
+        Abre una página nueva en el contexto actual y cierra la anterior.
+        
+        Es mucho más barato que recrear el contexto, y cada verificación empieza
+        sin el estado de la página anterior.
+        """
+        if self.page:
+            await self.page.close()
+        self.page = await self.context.new_page()
+        
+        # Configurar timeouts
+        self.page.set_default_timeout(30000)  # 30 segundos
+        
+    async def _route_request(self, route):
+        """
+        Aborta las peticiones que no aportan al scraping y deja pasar el resto.
+        
+        Args:
+            route: Ruta interceptada por Playwright
+        """
+        request = route.request
+        if request.resource_type in _BLOCKED_RESOURCE_TYPES or _BLOCKED_HOSTS_RE.search(request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+            
+    async def _save_screenshot(self, prefix: str, force: bool = False) -> Optional[str]:
+        """
+        Guarda un screenshot JPEG de la página actual.
+        
+        Args:
+            prefix: Prefijo del nombre de archivo
+            force: Si True, lo guarda aunque DEBUG_SCREENSHOTS esté desactivado
+                   (por ejemplo, cuando se detectó un error)
+            
+        Returns:
+            Ruta del archivo guardado, o None si no se tomó.
+        """
+        if not (self.capture_screenshots or force) or not self.page:
+            return None
+            
+        # Fecha y hora con microsegundos (se relaciona con los timestamps del log y no
+        # se pisan dentro del mismo segundo) + número de verificación
+        path = f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}_{self.attempt_count}.jpg'
+        try:
+            await self.page.screenshot(path=path, type='jpeg', quality=60, full_page=False)
+        except Exception as e:
+            self.logger.warning(f"No se pudo guardar el screenshot {path}: {str(e)}")
+            return None
+            
+        self.print_colored(f"📸 Screenshot guardado: {path}", Fore.BLUE)
+        return path
+        
+    def _schedule_screenshot(self, prefix: str):
+        """
+        Toma un screenshot en segundo plano, sin detener el flujo mientras se codifica.
+        
+        Solo actúa con DEBUG_SCREENSHOTS=1.
+        
+        Args:
+            prefix: Prefijo del nombre de archivo
+        """
+        if not self.capture_screenshots or not self.page:
+            return
+            
+        task = asyncio.create_task(self._save_screenshot(prefix))
+        # Mantener una referencia hasta que termine para que no se recolecte antes
+        self._screenshot_tasks.add(task)
+        task.add_done_callback(self._screenshot_tasks.discard)
+        
     async def navigate_to_site(self):
         """
         Navega al sitio web de reserva de licencias.
@@ -401,33 +945,36 @@ class LicenciaScraper:
         try:
             self.print_colored(f"🔗 Navegando a: {self.target_url}", Fore.BLUE)
             
-            # Limpiar datos antes de navegar
-            await self._clear_browser_data()
-            
-            # Navegar a la URL
-            response = await self.page.goto(self.target_url, wait_until='networkidle')
+            # Navegar a la URL (basta con el DOM; no esperar a que la red quede inactiva)
+            response = await self.page.goto(self.target_url, wait_until='domcontentloaded')
             
             if response and response.status == 200:
                 self.print_colored("✅ Página cargada correctamente", Fore.GREEN)
                 self.logger.info(f"Navegación exitosa a {self.target_url}")
                 
-                # Esperar a que la página se cargue completamente
-                await self.page.wait_for_load_state('domcontentloaded')
+                # Esperar solo al campo de RUT, que es lo que se necesita a continuación
+                try:
+                    await self.page.wait_for_selector(_RUT_INPUT_SELECTOR, timeout=15000)
+                except PlaywrightTimeoutError:
+                    self.print_colored("⚠️ El campo de RUT no apareció tras la carga", Fore.YELLOW)
+                    self.logger.warning("El campo de RUT no apareció tras la carga")
                 
                 # Verificar y cerrar modales si aparecen
                 await self._detect_and_close_modals()
                 
-                # Tomar screenshot para debug
-                await self.page.screenshot(path=f'screenshot_step2_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+                # Tomar screenshot para debug (solo con DEBUG_SCREENSHOTS=1)
+                await self._save_screenshot('screenshot_step2')
                 
             else:
                 status_code = response.status if response else "Sin respuesta"
                 self.print_colored(f"⚠️ Respuesta inesperada del servidor: {status_code}", Fore.YELLOW)
                 self.logger.warning(f"Respuesta del servidor: {status_code}")
+                await self._save_screenshot('screenshot_step2', force=True)
                 
         except Exception as e:
             self.print_colored(f"❌ Error al navegar al sitio: {str(e)}", Fore.RED)
             self.logger.error(f"Error al navegar: {str(e)}")
+            await self._save_screenshot('screenshot_step2', force=True)
             raise
             
     async def fill_rut_form(self, rut: str = None):
@@ -447,102 +994,36 @@ class LicenciaScraper:
             
             self.print_colored(f"📝 Ingresando RUT: {rut_to_use}", Fore.BLUE)
             
-            # Buscar el campo de RUT (puede tener diferentes selectores)
-            rut_selectors = [
-                'input[name="txtRut"]',
-                'input[id="txtRut"]',
-                'input[type="text"]',
-                '#txtRut'
-            ]
+            # Campo de RUT (un único selector que acepta cualquiera de las variantes).
+            # Locator.fill espera al elemento, lo enfoca, reemplaza su contenido y
+            # dispara los eventos de entrada en una sola operación
+            rut_input = self.page.locator(_RUT_INPUT_SELECTOR).first
+            if await rut_input.count() == 0:
+                # Solo si no existe el campo con nombre se usa el primer input de texto
+                rut_input = self.page.locator('input[type="text"]').first
             
-            rut_input = None
-            for selector in rut_selectors:
-                try:
-                    rut_input = await self.page.wait_for_selector(selector, timeout=5000)
-                    if rut_input:
-                        self.print_colored(f"✅ Campo RUT encontrado con selector: {selector}", Fore.GREEN)
-                        break
-                except:
-                    continue
-                    
-            if not rut_input:
-                raise Exception("No se pudo encontrar el campo de RUT")
-                
-            # Limpiar y llenar el campo de forma explícita y agresiva
-            self.print_colored(f"🧹 Limpiando campo RUT completamente...", Fore.YELLOW)
-            
-            # Método 1: Hacer clic y seleccionar todo
-            await rut_input.click()
-            await self.page.wait_for_timeout(300)
-            await rut_input.press('Control+a')  # Seleccionar todo
-            await self.page.wait_for_timeout(200)
-            await rut_input.press('Delete')     # Borrar contenido
-            await self.page.wait_for_timeout(300)
-            
-            # Método 2: Verificar que esté vacío y forzar limpieza si es necesario
-            current_value = await rut_input.input_value()
-            self.print_colored(f"📋 Valor actual en campo: '{current_value}'", Fore.CYAN)
-            
-            if current_value and current_value.strip():
-                self.print_colored("⚠️ Campo no se limpió, usando métodos alternativos...", Fore.YELLOW)
-                
-                # Método alternativo 1: Usar evaluate para limpiar directamente
-                await self.page.evaluate("""
-                    (selector) => {
-                        const element = document.querySelector(selector);
-                        if (element) {
-                            element.value = '';
-                            element.dispatchEvent(new Event('input', { bubbles: true }));
-                            element.dispatchEvent(new Event('change', { bubbles: true }));
-                        }
-                    }
-                """, f'input[name="txtRut"], input[id="txtRut"], #txtRut')
-                
-                await self.page.wait_for_timeout(300)
+            if self.debug:
+                self.print_colored(f"✍️ Llenando con nuevo RUT: {rut_to_use}", Fore.GREEN)
                 
-                # Verificar de nuevo
-                current_value = await rut_input.input_value()
-                self.print_colored(f"📋 Valor después de limpieza forzada: '{current_value}'", Fore.CYAN)
-                
-                # Si aún no está vacío, usar método más agresivo
-                if current_value and current_value.strip():
-                    self.print_colored("🔥 Usando limpieza ultra-agresiva...", Fore.RED)
-                    await rut_input.click()
-                    await self.page.wait_for_timeout(200)
-                    
-                    # Seleccionar carácter por carácter y borrar
-                    for _ in range(len(current_value) + 5):  # +5 por seguridad
-                        await rut_input.press('Backspace')
-                        await self.page.wait_for_timeout(50)
-                    
-                    await self.page.wait_for_timeout(300)
-            
-            # Verificación final antes de llenar
-            final_check = await rut_input.input_value()
-            self.print_colored(f"📋 Valor final antes de llenar: '{final_check}'", Fore.CYAN)
-            
-            # Ahora llenar con el nuevo valor
-            self.print_colored(f"✍️ Llenando con nuevo RUT: {rut_to_use}", Fore.GREEN)
-            await rut_input.fill(rut_to_use)
-            await self.page.wait_for_timeout(500)  # Esperar a que se procese
+            try:
+                await rut_input.fill(rut_to_use, timeout=5000)
+            except PlaywrightTimeoutError:
+                raise Exception("No se pudo encontrar el campo de RUT")
             
-            # Verificar que se llenó correctamente
+            # Verificar que se llenó correctamente (única lectura en el camino normal)
             filled_value = await rut_input.input_value()
-            self.print_colored(f"📋 Valor después de llenar: '{filled_value}'", Fore.CYAN)
+            if self.debug:
+                self.print_colored(f"📋 Valor después de llenar: '{filled_value}'", Fore.CYAN)
             
             if filled_value != rut_to_use:
                 self.print_colored(f"⚠️ VALOR INCORRECTO! Esperado: '{rut_to_use}', Actual: '{filled_value}'", Fore.RED)
                 
                 # Último intento con método typing
                 self.print_colored("🔄 Último intento con método typing...", Fore.YELLOW)
-                await rut_input.click()
-                await rut_input.press('Control+a')
-                await rut_input.press('Delete')
-                await self.page.wait_for_timeout(300)
+                await rut_input.evaluate(_RESET_INPUT_JS)
                 
                 # Escribir carácter por carácter
                 await rut_input.type(rut_to_use, delay=100)
-                await self.page.wait_for_timeout(300)
                 
                 # Verificación final
                 final_value = await rut_input.input_value()
@@ -557,33 +1038,34 @@ class LicenciaScraper:
             await self._detect_and_close_modals()
             
             # Buscar y hacer clic en el botón de envío
-            submit_selectors = [
-                'input[type="submit"]',
-                'button[type="submit"]',
-                'input[value="ingresar"]',
-                '#btnIngresar',
-                '.btn-submit'
-            ]
+            submit_selector = 'input[type="submit"], button[type="submit"], input[value="ingresar"], #btnIngresar, .btn-submit'
             
             submit_button = None
-            for selector in submit_selectors:
-                try:
-                    submit_button = await self.page.wait_for_selector(selector, timeout=5000)
-                    if submit_button:
-                        self.print_colored(f"✅ Botón de envío encontrado: {selector}", Fore.GREEN)
-                        break
-                except:
-                    continue
+            try:
+                submit_button = await self.page.wait_for_selector(submit_selector, timeout=5000)
+            except Exception:
+                pass
                     
             if not submit_button:
                 raise Exception("No se pudo encontrar el botón de envío")
                 
+            self.print_colored("✅ Botón de envío encontrado", Fore.GREEN)
+                
             # Hacer clic en el botón
             self.print_colored("🔄 Enviando formulario...", Fore.BLUE)
+            url_before = self.page.url
             await submit_button.click()
             
-            # Esperar a que la página responda
-            await self.page.wait_for_load_state('networkidle', timeout=30000)
+            # Esperar a que el sitio avance al siguiente paso (paso-N.aspx o estatus.aspx).
+            # Se exige que la URL cambie: la página actual no cuenta como respuesta
+            try:
+                await self.page.wait_for_url(
+                    lambda url: url != url_before and ('paso-' in url or 'estatus' in url),
+                    timeout=15000,
+                )
+            except PlaywrightTimeoutError:
+                # El sitio respondió sin cambiar de URL; basta con que el DOM esté listo
+                await self.page.wait_for_load_state('domcontentloaded')
             
             # Verificar modales después del envío
             await self._detect_and_close_modals()
@@ -596,67 +1078,39 @@ class LicenciaScraper:
             self.logger.error(f"Error al llenar formulario: {str(e)}")
             raise
             
-    async def _check_error_messages(self):
+    async def _check_error_messages(self, page_text: Optional[str] = None):
         """
         Verifica si hay mensajes de error en la página actual.
         
+        Args:
+            page_text: Texto visible de la página, si ya se obtuvo. Si es None, se lee de la página.
+        
         Returns:
             Dict con información del error si se encuentra, None si no hay errores.
         """
         try:
             self.print_colored("🔍 Verificando mensajes de error en la página...", Fore.BLUE)
             
-            # Obtener todo el contenido de la página
-            page_content = await self.page.content()
-            
-            # Buscar elementos específicos que contengan errores
-            error_selectors = [
-                '.error',
-                '.alert',
-                '.warning',
-                '[class*="error"]',
-                '[class*="alert"]',
-                'div[style*="color:red"]',
-                'div[style*="color: red"]',
-                'span[style*="color:red"]',
-                'span[style*="color: red"]'
-            ]
+            # Obtener solo el texto visible de la página (mucho menor que el HTML completo)
+            if page_text is None:
+                page_text = await self.page.evaluate(_PAGE_TEXT_JS)
             
+            # Buscar errores por selectores: un solo selector y una sola ejecución en el navegador
+            # que devuelve el texto de todos los elementos encontrados
             found_errors = []
-            
-            # Buscar errores por selectores
-            for selector in error_selectors:
-                try:
-                    elements = await self.page.query_selector_all(selector)
-                    for element in elements:
-                        text = await element.text_content()
-                        if text and text.strip():
-                            found_errors.append(text.strip())
-                except:
-                    continue
-            
-            # Buscar patrones de error específicos en el contenido HTML
-            error_patterns = [
-                r'<b[^>]*>.*?Atención!.*?Error:.*?</b>',
-                r'Error:.*?(?=<|$)',
-                r'Atención!.*?Error:.*?(?=<|$)',
-                r'ud\. ha excedido el tiempo máximo de espera',
-                r'tiempo máximo de espera',
-                r'no existen horas disponibles',
-                r'sin disponibilidad',
-                r'agendas llenas',
-                r'\*\*Atención!\*\*\s*Error:.*?(?=<|$)',
-                r'Atención!\s*Error:.*?Ud\. ha excedido el tiempo máximo de espera',
-                r'Buscando especialidades\.\.\.\.'
-            ]
-            
-            for pattern in error_patterns:
-                matches = re.findall(pattern, page_content, re.IGNORECASE | re.DOTALL)
-                for match in matches:
-                    # Limpiar HTML tags
-                    clean_text = re.sub(r'<[^>]+>', '', match).strip()
-                    if clean_text and clean_text not in found_errors:
-                        found_errors.append(clean_text)
+            try:
+                found_errors = await self.page.eval_on_selector_all(
+                    _ERROR_ELEMENTS_SELECTOR,
+                    "els => els.map(e => (e.textContent || '').trim()).filter(Boolean)"
+                )
+            except Exception:
+                pass
+            
+            # Buscar patrones de error específicos en el texto (una sola pasada)
+            for match in _ERROR_RE.finditer(page_text):
+                clean_text = match.group(0).strip()
+                if clean_text and clean_text not in found_errors:
+                    found_errors.append(clean_text)
             
             # Mostrar errores encontrados
             if found_errors:
@@ -669,36 +1123,21 @@ class LicenciaScraper:
                 
                 self.print_colored("=" * 60, Fore.RED)
                 
-                # Determinar el tipo de error
-                error_text_lower = ' '.join(found_errors).lower()
-                
-                if 'tiempo máximo de espera' in error_text_lower or 'excedido' in error_text_lower:
-                    return {
-                        'available': False,
-                        'status': 'timeout_error',
-                        'message': f'Error de timeout detectado: {found_errors[0]}',
-                        'url': self.page.url,
-                        'timestamp': datetime.now().isoformat(),
-                        'all_errors': found_errors
-                    }
-                elif 'no existen horas' in error_text_lower or 'sin disponibilidad' in error_text_lower:
-                    return {
-                        'available': False,
-                        'status': 'no_availability_error',
-                        'message': f'Sin disponibilidad: {found_errors[0]}',
-                        'url': self.page.url,
-                        'timestamp': datetime.now().isoformat(),
-                        'all_errors': found_errors
-                    }
+                # Determinar el tipo de error: la primera categoría que coincide, por prioridad
+                errors_text = ' '.join(found_errors)
+                error_kind = next(
+                    (kind for kind, kind_re in _ERROR_KINDS if kind_re.search(errors_text)),
+                    'unknown_error'
+                )
+                
+                if error_kind == 'timeout_error':
+                    available, message = False, f'Error de timeout detectado: {found_errors[0]}'
+                elif error_kind == 'no_availability_error':
+                    available, message = False, f'Sin disponibilidad: {found_errors[0]}'
                 else:
-                    return {
-                        'available': None,
-                        'status': 'unknown_error',
-                        'message': f'Error desconocido: {found_errors[0]}',
-                        'url': self.page.url,
-                        'timestamp': datetime.now().isoformat(),
-                        'all_errors': found_errors
-                    }
+                    available, message = None, f'Error desconocido: {found_errors[0]}'
+                    
+                return self._mk_result(available, error_kind, message, all_errors=found_errors)
             else:
                 self.print_colored("✅ No se detectaron mensajes de error", Fore.GREEN)
                 return None
@@ -718,24 +1157,36 @@ class LicenciaScraper:
         self.print_step(4, "Verificando disponibilidad de citas")
         
         try:
-            # Verificar y cerrar modales al inicio
-            modal_found = await self._detect_and_close_modals()
-            if modal_found:
-                # Si había un modal, esperar un poco más para que la página se estabilice
-                await self.page.wait_for_timeout(2000)
+            # Verificar y cerrar modales al inicio (ya espera a que se terminen de cerrar)
+            await self._detect_and_close_modals()
             
             # Obtener URL actual
             current_url = self.page.url
             self.print_colored(f"🔍 URL actual: {current_url}", Fore.BLUE)
             
-            # Tomar screenshot para análisis
-            screenshot_path = f'screenshot_result_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-            await self.page.screenshot(path=screenshot_path)
-            self.print_colored(f"📸 Screenshot guardado: {screenshot_path}", Fore.BLUE)
+            # Tomar screenshot para análisis (en segundo plano, solo con DEBUG_SCREENSHOTS=1)
+            self._schedule_screenshot('screenshot_result')
             
+            # Verificar si hay error de disponibilidad en la URL: si la URL ya lo indica,
+            # no hace falta revisar el contenido de la página
+            page_kind = self._classify_url(current_url)
+            if page_kind == 'no_availability':
+                self.print_colored("❌ NO HAY CITAS DISPONIBLES", Fore.RED, Style.BRIGHT)
+                self.print_colored("🔄 El sistema indica que no existen horas disponibles", Fore.YELLOW)
+                
+                result = self._mk_result(
+                    False,
+                    'no_availability',
+                    'No existen horas disponibles en la especialidad solicitada',
+                    url=current_url
+                )
+                
+                self.logger.info("No hay citas disponibles")
+                return result
+                
             # Si estamos en paso-1.aspx o estatus.aspx, buscar el botón específico
-            if 'paso-1.aspx' in current_url or 'estatus.aspx' in current_url:
-                self.print_colored(f"🔍 Detectado {current_url.split('/')[-1]}, buscando botón de especialidades...", Fore.BLUE)
+            if page_kind:
+                self.print_colored(f"🔍 Detectado {current_url.rpartition('/')[2]}, buscando botón de especialidades...", Fore.BLUE)
                 
                 # Buscar mensajes de error primero
                 error_result = await self._check_error_messages()
@@ -743,136 +1194,29 @@ class LicenciaScraper:
                     return error_result
                 
                 # Si estamos en estatus.aspx, usar el manejador específico
-                if 'estatus.aspx' in current_url:
+                if page_kind == 'estatus':
                     estatus_info = await self._handle_estatus_page()
                     if estatus_info and estatus_info.get('errors'):
                         # Si hay errores en estatus, retornar inmediatamente
-                        return {
-                            'available': False,
-                            'status': 'estatus_error',
-                            'message': f'Errores en página de estatus: {"; ".join(estatus_info["errors"])}',
-                            'url': current_url,
-                            'timestamp': datetime.now().isoformat(),
-                            'estatus_info': estatus_info
-                        }
+                        return self._mk_result(
+                            False,
+                            'estatus_error',
+                            f'Errores en página de estatus: {"; ".join(estatus_info["errors"])}',
+                            url=current_url,
+                            estatus_info=estatus_info
+                        )
                 
                 # Intentar hacer clic en el botón de especialidades con reintentos después de modales
                 return await self._click_especialidad_button_with_modal_retry()
             
-            # Verificar si hay error de disponibilidad en la URL
-            if self.error_url_pattern in current_url:
-                self.print_colored("❌ NO HAY CITAS DISPONIBLES", Fore.RED, Style.BRIGHT)
-                self.print_colored("🔄 El sistema indica que no existen horas disponibles", Fore.YELLOW)
-                
-                result = {
-                    'available': False,
-                    'status': 'no_availability',
-                    'message': 'No existen horas disponibles en la especialidad solicitada',
-                    'url': current_url,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                self.logger.info("No hay citas disponibles")
-                return result
-                
-            # Buscar indicadores de disponibilidad en el contenido
-            page_content = await self.page.content()
-            
-            # Palabras clave que indican falta de disponibilidad
-            no_availability_keywords = [
-                'no existen horas disponibles',
-                'sin disponibilidad',
-                'no hay citas',
-                'agendas llenas',
-                'sin cupos',
-                'ud. ha excedido el tiempo máximo de espera',
-                'tiempo máximo de espera'
-            ]
-            
-            # Palabras clave que indican disponibilidad
-            availability_keywords = [
-                'seleccione fecha',
-                'horarios disponibles',
-                'agendar cita',
-                'reservar hora'
-            ]
-            
-            content_lower = page_content.lower()
-            
-            # Verificar falta de disponibilidad
-            for keyword in no_availability_keywords:
-                if keyword in content_lower:
-                    self.print_colored(f"❌ Detectado: '{keyword}' en el contenido", Fore.RED)
-                    result = {
-                        'available': False,
-                        'status': 'no_availability_content',
-                        'message': f'Detectado en contenido: {keyword}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    return result
-                    
-            # Verificar disponibilidad
-            for keyword in availability_keywords:
-                if keyword in content_lower:
-                    self.print_colored(f"✅ ¡CITAS DISPONIBLES! Detectado: '{keyword}'", Fore.GREEN, Style.BRIGHT)
-                    result = {
-                        'available': True,
-                        'status': 'availability_found',
-                        'message': f'Disponibilidad detectada: {keyword}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    return result
-                    
-            # Si no se detecta nada específico, analizar la estructura de la página
-            self.print_colored("🔍 Analizando estructura de la página...", Fore.BLUE)
-            
-            # Buscar elementos que indiquen el siguiente paso del proceso
-            next_step_selectors = [
-                'select[name*="fecha"]',
-                'input[type="date"]',
-                '.calendar',
-                '#calendario',
-                'select[name*="hora"]'
-            ]
-            
-            for selector in next_step_selectors:
-                element = await self.page.query_selector(selector)
-                if element:
-                    self.print_colored(f"✅ ¡POSIBLE DISPONIBILIDAD! Encontrado elemento: {selector}", Fore.GREEN)
-                    result = {
-                        'available': True,
-                        'status': 'possible_availability',
-                        'message': f'Elemento de selección encontrado: {selector}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    return result
-                    
-            # Si llegamos aquí, el estado es incierto
-            self.print_colored("⚠️ Estado incierto - requiere revisión manual", Fore.YELLOW)
-            result = {
-                'available': None,
-                'status': 'uncertain',
-                'message': 'No se pudo determinar la disponibilidad automáticamente',
-                'url': current_url,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            return result
+            # Buscar indicadores de disponibilidad en el contenido de la página
+            return await self._classify_availability(current_url)
             
         except Exception as e:
             self.print_colored(f"❌ Error al verificar disponibilidad: {str(e)}", Fore.RED)
             self.logger.error(f"Error al verificar disponibilidad: {str(e)}")
             
-            result = {
-                'available': None,
-                'status': 'error',
-                'message': f'Error durante verificación: {str(e)}',
-                'url': self.page.url if self.page else 'unknown',
-                'timestamp': datetime.now().isoformat()
-            }
+            result = self._mk_result(None, 'error', f'Error durante verificación: {str(e)}')
             return result
 
     async def _click_especialidad_button_with_modal_retry(self) -> Dict[str, Any]:
@@ -884,19 +1228,7 @@ class LicenciaScraper:
             Dict con el resultado de la verificación después del clic exitoso.
         """
         retry_count = 0
-        
-        # Priorizar el botón específico que mencionó el usuario
-        primary_button_selector = '#dgGrilla_btIngresar_0'
-        
-        # Selectores alternativos por si el principal no está disponible
-        alternative_selectors = [
-            'input[id="dgGrilla_btIngresar_0"]',
-            'input[name="dgGrilla$ctl02$btIngresar"]',
-            '.BotonIngresar',
-            'input.BotonIngresar',
-            'th:contains("Modificar") ~ td input[type="submit"]',
-            'table input[id*="btIngresar"]'
-        ]
+        backoff = _RETRY_BACKOFF_INITIAL
         
         self.print_colored(f"\n{'🔄 MODO REINTENTO INFINITO HASTA PASAR MODAL 🔄':^60}", Fore.CYAN, Style.BRIGHT)
         self.print_colored("El navegador se mantendrá abierto hasta lograr pasar el modal", Fore.CYAN)
@@ -907,8 +1239,8 @@ class LicenciaScraper:
                 retry_count += 1
                 self.print_colored(f"\n🔄 Intento #{retry_count} para hacer clic en botón de especialidades", Fore.BLUE)
                 
-                # Buscar tabla y mostrar información (solo en el primer intento)
-                if retry_count == 1:
+                # Buscar tabla y mostrar información (solo en el primer intento y en modo debug)
+                if retry_count == 1 and self.debug:
                     self.print_colored("🔍 Verificando tabla de especialidades...", Fore.BLUE)
                     
                     table_info = await self.page.evaluate("""
@@ -940,35 +1272,21 @@ class LicenciaScraper:
                             self.print_colored(f"   Tabla {table['index']}: Headers: {table['headers']}", Fore.CYAN)
                             self.print_colored(f"   Botones ({table['buttonCount']}): {table['buttonIds']}", Fore.CYAN)
                 
-                # Buscar el botón prioritario primero
-                especialidad_button = None
-                
-                try:
-                    especialidad_button = await self.page.wait_for_selector(primary_button_selector, timeout=5000)
-                    if especialidad_button:
-                        self.print_colored(f"✅ Botón prioritario encontrado: {primary_button_selector}", Fore.GREEN)
-                except:
-                    # Si no se encuentra el botón prioritario, buscar alternativas
-                    self.print_colored(f"⚠️ Botón prioritario {primary_button_selector} no encontrado, buscando alternativas...", Fore.YELLOW)
-                    
-                    for selector in alternative_selectors:
-                        try:
-                            especialidad_button = await self.page.wait_for_selector(selector, timeout=3000)
-                            if especialidad_button:
-                                self.print_colored(f"✅ Botón alternativo encontrado: {selector}", Fore.GREEN)
-                                break
-                        except:
-                            continue
-                
-                if not especialidad_button:
-                    self.print_colored("❌ No se encontró el botón de especialidades, esperando 3 segundos antes de reintentar...", Fore.RED)
-                    await self.page.wait_for_timeout(3000)
+                # Esperar a que aparezca el botón principal o cualquiera de sus alternativas
+                especialidad_button = await self._find_especialidad_button()
+                if especialidad_button is None:
+                    self._print_retry(retry_count, "❌ No se encontró el botón de especialidades, esperando a que aparezca antes de reintentar...", Fore.RED)
+                    await self._wait_for_retry(_ESPECIALIDAD_BUTTON_VISIBLE_SELECTOR)
+                    backoff = await self._sleep_backoff(backoff)
                     continue  # Continuar el bucle infinito
+                    
+                self._print_retry(retry_count, "✅ Botón de especialidades encontrado", Fore.GREEN)
                 
                 # Verificar modales antes de hacer clic
                 await self._detect_and_close_modals()
                 
-                self.print_colored("🔄 Haciendo clic en botón de especialidades...", Fore.BLUE)
+                self._print_retry(retry_count, "🔄 Haciendo clic en botón de especialidades...")
+                url_before = self.page.url
                 await especialidad_button.click()
                 
                 # Esperar a que la página responda
@@ -978,29 +1296,34 @@ class LicenciaScraper:
                 modal_appeared = await self._detect_and_close_modals()
                 
                 if modal_appeared:
-                    self.print_colored(f"🚨 Modal detectado después del clic (Intento #{retry_count}). Reintentando...", Fore.YELLOW)
-                    self.print_colored("🔄 Esperando 2 segundos antes del siguiente intento...", Fore.BLUE)
-                    await self.page.wait_for_timeout(2000)
+                    self._print_retry(retry_count, f"🚨 Modal detectado después del clic (Intento #{retry_count}). Reintentando...", Fore.YELLOW)
+                    backoff = await self._sleep_backoff(backoff)
                     continue  # Continuar el bucle infinito
                 
-                # Si no hay modales, verificar la nueva URL y errores
+                # Sin modales: tomar screenshot en segundo plano (solo con DEBUG_SCREENSHOTS=1)
+                # y verificar la nueva URL y errores
+                self._schedule_screenshot('screenshot_after_click')
                 new_url = self.page.url
-                self.print_colored(f"🔍 Nueva URL después del clic: {new_url}", Fore.BLUE)
+                self._print_retry(retry_count, f"🔍 Nueva URL después del clic: {new_url}")
+                
+                # El clic pasó el modal y la página avanzó: hubo progreso real, reiniciar la espera
+                if new_url != url_before:
+                    backoff = _RETRY_BACKOFF_INITIAL
                 
-                # Tomar screenshot después del clic exitoso
-                screenshot_path = f'screenshot_after_click_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-                await self.page.screenshot(path=screenshot_path)
-                self.print_colored(f"📸 Screenshot después del clic: {screenshot_path}", Fore.BLUE)
+                # Leer el texto de la página una sola vez: sirve para buscar errores y,
+                # si no los hay, para clasificar la disponibilidad
+                page_text = await self.page.evaluate(_PAGE_TEXT_JS)
                 
                 # Verificar errores después del clic
-                error_result = await self._check_error_messages()
+                error_result = await self._check_error_messages(page_text)
                 if error_result:
                     # Si hay error después del clic, decidir si reintentar o devolver error
                     error_status = error_result.get('status', '')
                     if error_status in ['timeout_error', 'estatus_error']:
-                        self.print_colored(f"⚠️ Error detectado: {error_result.get('message')}", Fore.YELLOW)
-                        self.print_colored("🔄 Reintentando debido a error temporal...", Fore.BLUE)
-                        await self.page.wait_for_timeout(2000)
+                        self._print_retry(retry_count, f"⚠️ Error detectado: {error_result.get('message')}", Fore.YELLOW)
+                        self._print_retry(retry_count, "🔄 Reintentando debido a error temporal...")
+                        await self._wait_for_retry(_ESPECIALIDAD_BUTTON_VISIBLE_SELECTOR)
+                        backoff = await self._sleep_backoff(backoff)
                         continue  # Continuar el bucle infinito
                     else:
                         # Error definitivo, retornar
@@ -1010,118 +1333,252 @@ class LicenciaScraper:
                 self.print_colored(f"✅ ¡ÉXITO! Clic exitoso en botón de especialidades después de {retry_count} intentos", Fore.GREEN, Style.BRIGHT)
                 
                 # Continuar con la verificación normal de disponibilidad
-                return await self._continue_availability_check()
+                return await self._continue_availability_check(page_text.lower())
                 
             except KeyboardInterrupt:
                 self.print_colored(f"\n🛑 Reintentos detenidos por el usuario después de {retry_count} intentos", Fore.YELLOW)
-                return {
-                    'available': None,
-                    'status': 'user_interrupted',
-                    'message': f'Usuario detuvo los reintentos después de {retry_count} intentos',
-                    'url': self.page.url,
-                    'timestamp': datetime.now().isoformat()
-                }
+                return self._mk_result(
+                    None,
+                    'user_interrupted',
+                    f'Usuario detuvo los reintentos después de {retry_count} intentos'
+                )
                 
             except Exception as e:
                 self.print_colored(f"❌ Error en intento #{retry_count}: {str(e)}", Fore.RED)
-                self.print_colored("🔄 Esperando 3 segundos antes de reintentar...", Fore.BLUE)
-                await self.page.wait_for_timeout(3000)
+                self._print_retry(retry_count, "🔄 Esperando a que la página se estabilice antes de reintentar...")
+                await self._wait_for_retry(_ESPECIALIDAD_BUTTON_VISIBLE_SELECTOR)
+                backoff = await self._sleep_backoff(backoff)
                 continue  # Continuar el bucle infinito incluso con errores
 
-    async def _continue_availability_check(self) -> Dict[str, Any]:
+    def _classify_url_impl(self, url: str) -> Optional[str]:
         """
-        Continúa con la verificación de disponibilidad después de un clic exitoso.
+        Clasifica una URL del flujo de reserva (usar a través de self._classify_url,
+        que memoriza el resultado).
         
+        Args:
+            url: URL a clasificar
+            
         Returns:
-            Dict con el resultado de la verificación de disponibilidad.
+            'no_availability' si es la página de error de disponibilidad, 'paso-1' o
+            'estatus' si es una de esas páginas, o None en otro caso.
+        """
+        if self._error_url_re.search(url):
+            return 'no_availability'
+        url_match = _URL_RE.search(url)
+        return url_match.group(1) if url_match else None
+        
+    def _safe_url(self) -> str:
+        """Devuelve la URL de la página actual, o 'unknown' si no hay página."""
+        return self.page.url if self.page else 'unknown'
+        
+    def _mk_result(self, available: Optional[bool], status: str, message: str,
+                   url: Optional[str] = None, **extra) -> Dict[str, Any]:
+        """
+        Construye el diccionario de resultado de una verificación.
+        
+        Args:
+            available: True/False si se determinó la disponibilidad, None si no
+            status: Código del estado detectado
+            message: Descripción del resultado
+            url: URL a informar; por defecto la de la página actual
+            **extra: Campos adicionales del resultado
+            
+        Returns:
+            Dict con available, status, message, url, timestamp y los campos extra.
+        """
+        return {
+            'available': available,
+            'status': status,
+            'message': message,
+            'url': url if url is not None else self._safe_url(),
+            'timestamp': datetime.now().isoformat(),
+            **extra
+        }
+        
+    def _print_retry(self, retry_count: int, message: str, color: str = Fore.BLUE):
+        """
+        Muestra un mensaje de detalle del bucle de reintentos: en pantalla durante
+        el primer intento y, en los siguientes, solo en el log (nivel DEBUG).
+        
+        Args:
+            retry_count: Número del intento actual
+            message: Mensaje a mostrar
+            color: Color del mensaje en pantalla
+        """
+        if retry_count == 1:
+            self.print_colored(message, color)
+        else:
+            self._log_debug(message)
+            
+    async def _wait_for_modal_closed(self, timeout: int = 5000) -> None:
+        """
+        Espera a que no quede ningún modal abierto, sin una pausa fija.
+        
+        Args:
+            timeout: Tiempo máximo de espera en milisegundos
         """
         try:
-            current_url = self.page.url
-            page_content = await self.page.content()
-            
-            # Palabras clave que indican falta de disponibilidad
-            no_availability_keywords = [
-                'no existen horas disponibles',
-                'sin disponibilidad',
-                'no hay citas',
-                'agendas llenas',
-                'sin cupos',
-                'ud. ha excedido el tiempo máximo de espera',
-                'tiempo máximo de espera'
-            ]
+            await self.page.wait_for_function(_NO_OPEN_MODAL_JS, timeout=timeout)
+        except PlaywrightTimeoutError:
+            self.print_colored("⚠️ El modal sigue visible, continuando de todas formas...", Fore.YELLOW)
+    
+    async def _find_especialidad_button(self, timeout: int = 5000):
+        """
+        Busca el botón de especialidades visible, dando prioridad al botón principal.
+        
+        Args:
+            timeout: Tiempo máximo de espera total en milisegundos
             
-            # Palabras clave que indican disponibilidad
-            availability_keywords = [
-                'seleccione fecha',
-                'horarios disponibles',
-                'agendar cita',
-                'reservar hora'
-            ]
+        Returns:
+            Locator del botón, o None si no apareció ninguno visible.
+        """
+        primary_timeout = min(1000, timeout)
+        button = self.page.locator(_ESPECIALIDAD_BUTTON_SELECTOR)
+        try:
+            await button.wait_for(state='visible', timeout=primary_timeout)
+            return button
+        except PlaywrightTimeoutError:
+            pass
             
-            content_lower = page_content.lower()
-            
-            # Verificar falta de disponibilidad
-            for keyword in no_availability_keywords:
-                if keyword in content_lower:
-                    self.print_colored(f"❌ Detectado: '{keyword}' en el contenido", Fore.RED)
-                    return {
-                        'available': False,
-                        'status': 'no_availability_content',
-                        'message': f'Detectado en contenido: {keyword}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-            # Verificar disponibilidad
-            for keyword in availability_keywords:
-                if keyword in content_lower:
-                    self.print_colored(f"✅ ¡CITAS DISPONIBLES! Detectado: '{keyword}'", Fore.GREEN, Style.BRIGHT)
-                    return {
-                        'available': True,
-                        'status': 'availability_found',
-                        'message': f'Disponibilidad detectada: {keyword}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
+        # Alternativas: la primera visible en el DOM
+        button = self.page.locator(_ESPECIALIDAD_BUTTON_VISIBLE_SELECTOR).first
+        try:
+            await button.wait_for(state='visible', timeout=timeout - primary_timeout)
+            return button
+        except PlaywrightTimeoutError:
+            return None
+
+    async def _wait_for_retry(self, selector: str, timeout: int = 3000) -> None:
+        """
+        Espera a que la página esté lista para un nuevo intento: termina en cuanto
+        el selector indicado está presente (o al agotar el tiempo).
+        
+        Args:
+            selector: Selector que indica que la página está lista
+            timeout: Tiempo máximo de espera en milisegundos
+        """
+        try:
+            await self.page.wait_for_load_state('domcontentloaded', timeout=timeout)
+            await self.page.wait_for_selector(selector, timeout=timeout)
+        except Exception:
+            # Si no aparece, el siguiente intento lo reportará
+            pass
+
+    async def _sleep_backoff(self, backoff: float) -> float:
+        """
+        Espera antes del siguiente reintento con backoff exponencial y jitter.
+        
+        Args:
+            backoff: Espera base actual en segundos
             
-            # Buscar elementos que indiquen el siguiente paso del proceso
-            next_step_selectors = [
-                'select[name*="fecha"]',
-                'input[type="date"]',
-                '.calendar',
-                '#calendario',
-                'select[name*="hora"]'
-            ]
+        Returns:
+            Espera base para el próximo reintento.
+        """
+        await asyncio.sleep(min(backoff, _RETRY_BACKOFF_MAX) + random.uniform(0, _RETRY_BACKOFF_JITTER))
+        return min(backoff * 2, _RETRY_BACKOFF_MAX)
+
+    def _match_availability_keyword(self, content_lower: str) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        Busca palabras clave de disponibilidad en el texto (ya en minúsculas).
+        
+        Una palabra clave de falta de disponibilidad tiene prioridad sobre una de
+        disponibilidad, aunque aparezca después en el texto.
+        
+        Args:
+            content_lower: Texto de la página en minúsculas
             
-            for selector in next_step_selectors:
-                element = await self.page.query_selector(selector)
-                if element:
-                    self.print_colored(f"✅ ¡POSIBLE DISPONIBILIDAD! Encontrado elemento: {selector}", Fore.GREEN)
-                    return {
-                        'available': True,
-                        'status': 'possible_availability',
-                        'message': f'Elemento de selección encontrado: {selector}',
-                        'url': current_url,
-                        'timestamp': datetime.now().isoformat()
-                    }
+        Returns:
+            Tupla (disponible, palabra clave); (None, None) si no hay coincidencias.
+        """
+        # Camino rápido para el caso más común (búsqueda de subcadena en C)
+        if _HOT_NO_AVAILABILITY_KEYWORD in content_lower:
+            self._kw_hits[_HOT_NO_AVAILABILITY_KEYWORD] += 1
+            return False, _HOT_NO_AVAILABILITY_KEYWORD
+            
+        found = (None, None)
+        for match in _AVAILABILITY_KEYWORD_RE.finditer(content_lower):
+            if match.lastgroup == 'no_availability':
+                self._kw_hits[match.group(0)] += 1
+                return False, match.group(0)
+            if found[0] is None:
+                found = (True, match.group(0))
+        if found[1]:
+            self._kw_hits[found[1]] += 1
+        return found
+        
+    async def _classify_availability(self, current_url: str, content_lower: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Clasifica la disponibilidad a partir del contenido de la página actual:
+        primero por palabras clave y, si no hay, por elementos del siguiente paso.
+        
+        Args:
+            current_url: URL actual, incluida en el resultado
+            content_lower: Texto visible en minúsculas, si ya se obtuvo. Si es None, se lee de la página.
             
-            # Estado incierto
-            return {
-                'available': None,
-                'status': 'uncertain',
-                'message': 'No se pudo determinar la disponibilidad automáticamente',
-                'url': current_url,
-                'timestamp': datetime.now().isoformat()
-            }
+        Returns:
+            Dict con información sobre la disponibilidad detectada.
+        """
+        # Texto visible, ya en minúsculas
+        if content_lower is None:
+            content_lower = await self.page.evaluate(_PAGE_TEXT_LOWER_JS)
+        
+        # Buscar palabras clave de ambas listas en una sola pasada por el texto
+        available, keyword = self._match_availability_keyword(content_lower)
+        
+        # Verificar falta de disponibilidad
+        if available is False:
+            self.print_colored(f"❌ Detectado: '{keyword}' en el contenido", Fore.RED)
+            return self._mk_result(
+                False,
+                'no_availability_content',
+                f'Detectado en contenido: {keyword}',
+                url=current_url
+            )
+                
+        # Verificar disponibilidad
+        if available is True:
+            self.print_colored(f"✅ ¡CITAS DISPONIBLES! Detectado: '{keyword}'", Fore.GREEN, Style.BRIGHT)
+            return self._mk_result(True, 'availability_found', f'Disponibilidad detectada: {keyword}', url=current_url)
+                
+        # Si no se detecta nada específico, analizar la estructura de la página
+        self.print_colored("🔍 Analizando estructura de la página...", Fore.BLUE)
+        
+        # Buscar elementos que indiquen el siguiente paso del proceso
+        # (todos los selectores se prueban dentro del navegador en una sola llamada)
+        selector = await self.page.evaluate(_FIRST_MATCHING_SELECTOR_JS, list(_NEXT_STEP_SELECTORS))
+        if selector:
+            self.print_colored(f"✅ ¡POSIBLE DISPONIBILIDAD! Encontrado elemento: {selector}", Fore.GREEN)
+            return self._mk_result(
+                True,
+                'possible_availability',
+                f'Elemento de selección encontrado: {selector}',
+                url=current_url
+            )
+            
+        # Si llegamos aquí, el estado es incierto
+        self.print_colored("⚠️ Estado incierto - requiere revisión manual", Fore.YELLOW)
+        return self._mk_result(
+            None,
+            'uncertain',
+            'No se pudo determinar la disponibilidad automáticamente',
+            url=current_url
+        )
+
+    async def _continue_availability_check(self, content_lower: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Continúa con la verificación de disponibilidad después de un clic exitoso.
+        
+        Args:
+            content_lower: Texto visible de la página en minúsculas, si ya se obtuvo
+            
+        Returns:
+            Dict con el resultado de la verificación de disponibilidad.
+        """
+        try:
+            return await self._classify_availability(self.page.url, content_lower)
             
         except Exception as e:
-            return {
-                'available': None,
-                'status': 'error',
-                'message': f'Error durante verificación continua: {str(e)}',
-                'url': self.page.url if self.page else 'unknown',
-                'timestamp': datetime.now().isoformat()
-            }
+            return self._mk_result(None, 'error', f'Error durante verificación continua: {str(e)}')
 
     async def cleanup(self, force_close: bool = True):
         """
@@ -1132,15 +1589,7 @@ class LicenciaScraper:
         """
         try:
             if force_close:
-                if self.page:
-                    await self.page.close()
-                if self.context:
-                    await self.context.close()
-                if self.browser:
-                    await self.browser.close()
-                if hasattr(self, 'playwright'):
-                    await self.playwright.stop()
-                    
+                await self.shutdown()
                 self.print_colored("🧹 Recursos limpiados correctamente", Fore.GREEN)
             else:
                 self.print_colored("🔍 Manteniendo navegador abierto para inspección", Fore.CYAN)
@@ -1148,6 +1597,32 @@ class LicenciaScraper:
         except Exception as e:
             self.print_colored(f"⚠️ Error durante limpieza: {str(e)}", Fore.YELLOW)
             
+    async def shutdown(self):
+        """Cierra el navegador y detiene Playwright. Puede llamarse más de una vez."""
+        # Dejar terminar los screenshots pendientes antes de cerrar la página
+        if self._screenshot_tasks:
+            await asyncio.gather(*self._screenshot_tasks, return_exceptions=True)
+            
+        # Registrar las estadísticas una sola vez aunque shutdown se llame de nuevo
+        if self._kw_hits:
+            self.logger.info(f"Palabras clave detectadas: {dict(self._kw_hits.most_common())}")
+            self._kw_hits.clear()
+            
+        page, context, browser, playwright = self.page, self.context, self.browser, self.playwright
+        self.page = self.context = self.browser = self.playwright = None
+        
+        if page:
+            await page.close()
+        if context:
+            await context.close()
+        if browser:
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+        if self._http:
+            self._http.close()
+            self._http = None
+            
     async def run_single_check(self, rut: str = None, is_continuous: bool = False) -> Dict[str, Any]:
         """
         Ejecuta una verificación completa de disponibilidad.
@@ -1175,15 +1650,19 @@ class LicenciaScraper:
         result = {}  # Inicializar result para el bloque finally
         
         try:
-            # Paso 1: Inicializar navegador (solo si no existe o está cerrado)
+            # Paso 1: Inicializar navegador (solo si no existe) o relanzarlo si su proceso murió
             if not self.browser or not self.page:
                 await self.initialize_browser()
+            elif not self.browser.is_connected():
+                await self.hard_reset_browser()
             else:
                 self.print_colored("🔄 Reutilizando navegador existente", Fore.GREEN)
-            
-            # Paso 1.5: Si no es la primera ejecución, recrear contexto para evitar cache
-            if self.attempt_count > 1:
-                await self.recreate_browser_context()
+                
+                # Paso 1.5: Si no es la primera ejecución, limpiar el contexto para evitar cache
+                # (se recrea solo si la limpieza falla repetidamente) y abrir una página nueva
+                if self.attempt_count > 1:
+                    await self._soft_reset_context()
+                    await self._fresh_page()
             
             # Paso 2: Navegar al sitio
             await self.navigate_to_site()
@@ -1209,6 +1688,10 @@ class LicenciaScraper:
                     # No limpiar aún, el retry se manejará en el nivel superior
                     result['action'] = 'retry'
                     return result
+                elif action == "retry_without_restart":
+                    # Reintentar de inmediato con el mismo navegador (lo maneja el nivel superior)
+                    result['action'] = 'retry_without_restart'
+                    return result
                 elif action == "continue":
                     # Continuar como si no hubiera error
                     result['action'] = 'continue'
@@ -1241,18 +1724,13 @@ class LicenciaScraper:
             self.print_colored(f"❌ {error_msg}", Fore.RED)
             self.logger.error(error_msg)
             
-            return {
-                'available': None,
-                'status': 'error',
-                'message': error_msg,
-                'timestamp': datetime.now().isoformat()
-            }
+            return self._mk_result(None, 'error', error_msg)
             
         finally:
             # NUNCA cerrar navegador automáticamente durante reintentos de modales
             # Solo cerrar si el resultado no requiere mantener el navegador abierto
             should_close = not (
-                result.get('action') in ['retry', 'continue', 'continue_from_current'] or
+                result.get('action') in ['retry', 'retry_without_restart', 'continue', 'continue_from_current'] or
                 result.get('status') in ['user_interrupted', 'max_retries_exceeded'] or
                 is_continuous  # En modo continuo, mantener siempre abierto
             )
@@ -1280,7 +1758,10 @@ class LicenciaScraper:
         
         try:
             while True:
-                result = await self.run_single_check(rut_to_use, is_continuous=True)
+                # Consulta HTTP rápida: si ya indica que no hay horas, no se usa el navegador
+                result = await self._http_precheck() if self.http_precheck else None
+                if result is None:
+                    result = await self.run_single_check(rut_to_use, is_continuous=True)
                 
                 # Verificar si el usuario eligió salir (no debería ocurrir en modo continuo)
                 if result.get('action') == 'exit':
@@ -1290,9 +1771,7 @@ class LicenciaScraper:
                 # Verificar si el usuario eligió reintentar sin reiniciar navegador
                 if result.get('action') == 'retry_without_restart':
                     self.print_colored("\n♻️ Reintentando sin reiniciar navegador...", Fore.BLUE)
-                    # Limpiar datos del navegador actual pero mantener la instancia
-                    await self._clear_browser_data()
-                    await self.page.goto(self.target_url, wait_until='networkidle')
+                    # La siguiente verificación limpia el contexto (Paso 1.5) y vuelve al inicio
                     continue  # Reintentar inmediatamente sin esperar
                     
                 # Verificar si el usuario eligió reintentar (con reinicio completo)
@@ -1313,13 +1792,13 @@ class LicenciaScraper:
                     self.print_colored(f"\n⏰ Esperando {self.retry_interval} minutos hasta el próximo intento...", 
                                      Fore.BLUE)
                     
-                    # Mostrar cuenta regresiva
-                    for remaining in range(wait_seconds, 0, -60):
-                        minutes_left = remaining // 60
-                        if minutes_left > 0:
-                            print(f"\r⏳ {minutes_left} minutos restantes...", end='', flush=True)
-                            await asyncio.sleep(60)
-                            
+                    # Una sola espera; la cuenta regresiva es solo visual y corre aparte
+                    countdown_task = asyncio.create_task(self._countdown(wait_seconds))
+                    try:
+                        await asyncio.sleep(wait_seconds)
+                    finally:
+                        countdown_task.cancel()
+                        
                     print("\r" + " " * 30 + "\r", end='')  # Limpiar línea
                 
         except KeyboardInterrupt:
@@ -1330,50 +1809,81 @@ class LicenciaScraper:
             self.print_colored(f"\n❌ Error en monitoreo continuo: {str(e)}", Fore.RED)
             self.logger.error(f"Error en monitoreo continuo: {str(e)}")
 
-    async def recreate_browser_context(self):
-        """Recrea el contexto del navegador para eliminar completamente cualquier cache."""
+    async def _countdown(self, wait_seconds: int):
+        """
+        Muestra los minutos restantes hasta el próximo intento. Se cancela cuando
+        termina la espera principal.
+        
+        Args:
+            wait_seconds: Segundos totales de espera
+        """
+        for remaining in range(wait_seconds, 0, -60):
+            minutes_left = remaining // 60
+            if minutes_left > 0:
+                print(f"\r⏳ {minutes_left} minutos restantes...", end='', flush=True)
+            await asyncio.sleep(60)
+            
+    async def _http_precheck(self) -> Optional[Dict[str, Any]]:
+        """
+        Consulta la URL objetivo por HTTP (sin navegador), siguiendo redirecciones.
+        
+        Si el sitio redirige directamente a la página de "no existen horas disponibles",
+        la verificación termina aquí en una fracción del tiempo que tarda Playwright.
+        
+        Returns:
+            Dict con el resultado si la consulta basta para clasificar; None si hay
+            que hacer la verificación completa con el navegador.
+        """
+        if self._http is None:
+            self._http = requests.Session()
+            
+        loop = asyncio.get_running_loop()
         try:
-            self.print_colored("🔄 Recreando contexto del navegador para eliminar cache...", Fore.YELLOW)
-            
-            # Cerrar página y contexto actuales
-            if self.page:
-                await self.page.close()
-            if self.context:
-                await self.context.close()
-            
-            # Crear nuevo contexto completamente limpio
-            self.context = await self.browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1366, 'height': 768},
-                locale='es-CL',
-                # Configuraciones para evitar cache y datos guardados
-                ignore_https_errors=True,
-                java_script_enabled=True,
-                # No permitir que se guarde información
-                storage_state=None,  # No cargar estado previo
-                # Configuraciones adicionales de privacidad
-                permissions=[],  # Sin permisos especiales
-                extra_http_headers={
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
+            response = await loop.run_in_executor(
+                None, lambda: self._http.get(self.target_url, timeout=10, allow_redirects=True)
             )
+        except requests.RequestException as e:
+            self._log_debug(f"Consulta HTTP previa fallida, se usa el navegador: {str(e)}")
+            return None
             
-            # Crear nueva página
-            self.page = await self.context.new_page()
+        if self._classify_url(response.url) != 'no_availability':
+            return None
             
-            # Limpiar datos del nuevo contexto
-            await self._clear_browser_data()
+        self.print_colored("❌ NO HAY CITAS DISPONIBLES (detectado sin abrir el navegador)", Fore.RED, Style.BRIGHT)
+        self.logger.info("No hay citas disponibles (consulta HTTP)")
+        return self._mk_result(
+            False,
+            'no_availability',
+            'No existen horas disponibles en la especialidad solicitada',
+            url=response.url
+        )
+        
+    async def hard_reset_browser(self):
+        """
+        Relanza el navegador desde cero, con contexto y página nuevos.
+        
+        Solo se usa cuando el proceso del navegador murió; en los demás casos se
+        reutilizan el navegador y el contexto.
+        """
+        try:
+            self.print_colored("🔄 El navegador se cerró inesperadamente, relanzándolo...", Fore.YELLOW)
             
-            # Configurar timeouts
-            self.page.set_default_timeout(30000)  # 30 segundos
+            # El contexto y la página murieron con el proceso del navegador
+            browser = self.browser
+            self.page = self.context = self.browser = None
+            if browser:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+                    
+            await self.initialize_browser()
             
-            self.print_colored("✅ Contexto del navegador recreado exitosamente", Fore.GREEN)
+            self.print_colored("✅ Navegador relanzado exitosamente", Fore.GREEN)
             
         except Exception as e:
-            self.print_colored(f"❌ Error al recrear contexto: {str(e)}", Fore.RED)
-            self.logger.error(f"Error al recrear contexto: {str(e)}")
+            self.print_colored(f"❌ Error al relanzar el navegador: {str(e)}", Fore.RED)
+            self.logger.error(f"Error al relanzar el navegador: {str(e)}")
             raise
 
     async def _handle_estatus_page(self):
@@ -1386,104 +1896,46 @@ class LicenciaScraper:
         try:
             self.print_colored("🔍 Analizando página de estatus...", Fore.BLUE)
             
-            # Verificar si hay mensaje de "Buscando especialidades"
-            is_loading = await self.page.evaluate("""
-                () => {
-                    const bodyText = document.body.textContent || document.body.innerText || '';
-                    return bodyText.toLowerCase().includes('buscando especialidades');
+            # Esperar a que termine "Buscando especialidades..." (retorna de inmediato
+            # si la página ya cargó)
+            try:
+                await self.page.wait_for_function(_SPECIALTIES_LOADED_JS, timeout=3000)
+            except PlaywrightTimeoutError:
+                self.print_colored("⏳ Página sigue mostrando 'Buscando especialidades...'", Fore.YELLOW)
+                # Resultado interno (check_availability solo revisa 'errors'): no es un
+                # resultado de verificación, así que lleva una marca en nanosegundos en
+                # su propio campo en lugar de la fecha ISO formateada
+                return {
+                    'status': 'loading_specialties',
+                    'message': 'La página está cargando especialidades',
+                    'errors': [],
+                    'timestamp_ns': time.time_ns(),
                 }
-            """)
-            
-            if is_loading:
-                self.print_colored("⏳ Página mostrando 'Buscando especialidades...', esperando...", Fore.YELLOW)
-                await self.page.wait_for_timeout(3000)  # Esperar 3 segundos
-                
-                # Verificar de nuevo después de esperar
-                still_loading = await self.page.evaluate("""
-                    () => {
-                        const bodyText = document.body.textContent || document.body.innerText || '';
-                        return bodyText.toLowerCase().includes('buscando especialidades');
-                    }
-                """)
-                
-                if still_loading:
-                    return {
-                        'available': None,
-                        'status': 'loading_specialties',
-                        'message': 'La página está cargando especialidades',
-                        'url': self.page.url,
-                        'timestamp': datetime.now().isoformat()
-                    }
             
-            # Buscar tabla de especialidades
-            specialties_info = await self.page.evaluate("""
-                () => {
-                    const tables = document.querySelectorAll('table');
-                    let info = {
-                        hasTable: false,
-                        hasModifyColumn: false,
-                        hasButtons: false,
-                        specialties: [],
-                        errors: []
-                    };
-                    
-                    // Buscar errores visibles
-                    const errorElements = document.querySelectorAll('b, span, div');
-                    errorElements.forEach(el => {
-                        const text = el.textContent || el.innerText || '';
-                        if (text.includes('Error:') || text.includes('Atención!')) {
-                            info.errors.push(text.trim());
-                        }
-                    });
-                    
-                    // Analizar tablas
-                    tables.forEach(table => {
-                        const headers = Array.from(table.querySelectorAll('th')).map(th => th.textContent.trim());
-                        const hasModify = headers.some(h => h.toLowerCase().includes('modificar'));
-                        
-                        if (headers.length > 0) {
-                            info.hasTable = true;
-                            if (hasModify) {
-                                info.hasModifyColumn = true;
-                            }
-                            
-                            // Buscar botones en la tabla
-                            const buttons = Array.from(table.querySelectorAll('input[type="submit"]'));
-                            if (buttons.length > 0) {
-                                info.hasButtons = true;
-                                buttons.forEach(btn => {
-                                    const row = btn.closest('tr');
-                                    if (row) {
-                                        const cells = Array.from(row.querySelectorAll('td')).map(td => td.textContent.trim());
-                                        info.specialties.push({
-                                            id: btn.id || btn.name || 'sin-id',
-                                            cells: cells
-                                        });
-                                    }
-                                });
-                            }
-                        }
-                    });
-                    
-                    return info;
-                }
-            """)
+            # Analizar la página en una sola llamada al navegador
+            specialties_info = await self.page.evaluate(_SCAN_ESTATUS_CALL_JS)
             
-            self.print_colored("📋 Información de la página de estatus:", Fore.CYAN)
-            self.print_colored(f"   ✅ Tiene tabla: {specialties_info['hasTable']}", Fore.CYAN)
-            self.print_colored(f"   ✅ Tiene columna modificar: {specialties_info['hasModifyColumn']}", Fore.CYAN)
-            self.print_colored(f"   ✅ Tiene botones: {specialties_info['hasButtons']}", Fore.CYAN)
-            self.print_colored(f"   📊 Especialidades encontradas: {len(specialties_info['specialties'])}", Fore.CYAN)
+            lines = [
+                ("📋 Información de la página de estatus:", Fore.CYAN),
+                (f"   ✅ Tiene tabla: {specialties_info['hasTable']}", Fore.CYAN),
+                (f"   ✅ Tiene columna modificar: {specialties_info['hasModifyColumn']}", Fore.CYAN),
+                (f"   ✅ Tiene botones: {specialties_info['hasButtons']}", Fore.CYAN),
+                (f"   📊 Especialidades encontradas: {len(specialties_info['specialties'])}", Fore.CYAN),
+            ]
             
             if specialties_info['errors']:
-                self.print_colored("🚨 Errores detectados en la página:", Fore.RED)
-                for error in specialties_info['errors']:
-                    self.print_colored(f"   ❌ {error}", Fore.RED)
+                lines.append(("🚨 Errores detectados en la página:", Fore.RED))
+                lines.extend((f"   ❌ {error}", Fore.RED) for error in specialties_info['errors'])
             
             if specialties_info['specialties']:
-                self.print_colored("📋 Especialidades disponibles:", Fore.GREEN)
-                for i, spec in enumerate(specialties_info['specialties']):
-                    self.print_colored(f"   {i+1}. ID: {spec['id']} - Datos: {spec['cells']}", Fore.GREEN)
+                lines.append(("📋 Especialidades disponibles:", Fore.GREEN))
+                lines.extend(
+                    (f"   {i+1}. ID: {spec['id']} - Datos: {spec['cells']}", Fore.GREEN)
+                    for i, spec in enumerate(specialties_info['specialties'])
+                )
+                
+            # Todo el resumen en una sola escritura a la consola
+            self._batch_print(lines)
             
             return specialties_info
             
@@ -1501,68 +1953,45 @@ class LicenciaScraper:
         try:
             self.print_colored("🔍 Verificando presencia de modales/popups...", Fore.BLUE)
             
-            # Detectar diferentes tipos de modales
-            modal_selectors = [
-                # Modales comunes
-                '.modal',
-                '.popup',
-                '.dialog',
-                '.alert',
-                '[role="dialog"]',
-                '[role="alertdialog"]',
-                
-                # Modales Bootstrap
-                '.modal.show',
-                '.modal.fade.show',
-                
-                # Modales con overlay
-                '.modal-backdrop',
-                '.overlay',
-                
-                # Alertas del navegador (pueden aparecer como elementos DOM)
-                '.alert-dialog',
-                '.swal-modal',
-                '.sweetalert-modal',
-                
-                # Modales específicos del sitio
-                'div[style*="z-index"]:not([style*="display: none"])',
-                'div[style*="position: fixed"]',
-                'div[style*="position: absolute"][style*="top: 0"]'
-            ]
-            
             modal_found = False
-            
-            for selector in modal_selectors:
-                try:
-                    # Buscar modales visibles
-                    modals = await self.page.query_selector_all(selector)
-                    
-                    for modal in modals:
-                        # Verificar si el modal está visible
-                        is_visible = await modal.evaluate("""
-                            (element) => {
-                                const style = window.getComputedStyle(element);
-                                return style.display !== 'none' && 
-                                       style.visibility !== 'hidden' && 
-                                       style.opacity !== '0' &&
-                                       element.offsetHeight > 0 &&
-                                       element.offsetWidth > 0;
-                            }
-                        """)
+            pending = []
+            
+            # Validar los selectores una sola vez y unirlos en uno: una sola consulta al DOM
+            if self._modal_selector is None:
+                valid_selectors = await self.page.evaluate(_VALID_SELECTORS_JS, list(_MODAL_QUERY_SELECTORS))
+                for selector in set(_MODAL_QUERY_SELECTORS) - set(valid_selectors):
+                    self.logger.warning(f"Selector de modal inválido, se omite: {selector}")
+                self._modal_selector = ', '.join(valid_selectors)
+                
+            # Buscar todos los modales de una vez (incluido el selector preciso) y
+            # verificar su visibilidad en lote
+            modals = []
+            if self._modal_selector:
+                modals = await self.page.query_selector_all(self._modal_selector)
+            if modals:
+                matches = await self.page.evaluate(_MODAL_VISIBILITY_CALL_JS, modals)
+                visible = [(modal, index) for modal, index in zip(modals, matches) if index >= 0]
+                # Un modal marcado explícitamente como abierto tiene prioridad sobre los demás
+                precise = [(modal, index) for modal, index in visible if index == 0]
+                for modal, index in precise or visible:
+                    selector = _MODAL_QUERY_SELECTORS[index]
+                    self.print_colored(f"🚨 Modal detectado con selector: {selector}", Fore.YELLOW)
+                    pending.append((modal, selector))
                         
-                        if is_visible:
-                            self.print_colored(f"🚨 Modal detectado con selector: {selector}", Fore.YELLOW)
-                            modal_found = True
-                            
-                            # Intentar cerrar el modal con diferentes métodos
-                            closed = await self._close_modal(modal, selector)
-                            if closed:
-                                self.print_colored("✅ Modal cerrado exitosamente", Fore.GREEN)
-                                await self.page.wait_for_timeout(1000)  # Esperar 1 segundo
-                            
-                except Exception as e:
-                    # Continuar con el siguiente selector si hay error
-                    continue
+            if pending:
+                modal_found = True
+                
+                # Intentar cerrar todos los modales a la vez; un error en uno no
+                # impide cerrar los demás
+                results = await asyncio.gather(
+                    *(self._close_modal(modal, selector) for modal, selector in pending),
+                    return_exceptions=True
+                )
+                closed = sum(1 for result in results if result is True)
+                if closed:
+                    self.print_colored(f"✅ Modales cerrados exitosamente: {closed}/{len(pending)}", Fore.GREEN)
+                    # Esperar solo hasta que la página ya no muestre modales
+                    await self._wait_for_modal_closed(timeout=2000)
             
             if not modal_found:
                 self.print_colored("✅ No se detectaron modales", Fore.GREEN)
@@ -1585,33 +2014,13 @@ class LicenciaScraper:
             True si se cerró exitosamente, False en caso contrario.
         """
         try:
-            # Método 1: Buscar botón de cerrar dentro del modal
-            close_selectors = [
-                'button[data-dismiss="modal"]',
-                '.close',
-                '.btn-close',
-                '.modal-close',
-                'button.close',
-                '[aria-label="Close"]',
-                '[aria-label="Cerrar"]',
-                'button:contains("×")',
-                'button:contains("Cerrar")',
-                'button:contains("OK")',
-                'button:contains("Aceptar")',
-                '.fa-times',
-                '.fa-close'
-            ]
-            
-            for close_selector in close_selectors:
-                try:
-                    close_button = await modal_element.query_selector(close_selector)
-                    if close_button:
-                        self.print_colored(f"🔘 Haciendo clic en botón de cerrar: {close_selector}", Fore.BLUE)
-                        await close_button.click()
-                        await self.page.wait_for_timeout(500)
-                        return True
-                except:
-                    continue
+            # Método 1: Buscar botón de cerrar dentro del modal y hacer clic en él,
+            # todo dentro del navegador en una sola llamada
+            close_selector = await modal_element.evaluate(_CLICK_MODAL_CLOSE_CALL_JS)
+            if close_selector:
+                self.print_colored(f"🔘 Clic en botón de cerrar: {close_selector}", Fore.BLUE)
+                await self.page.wait_for_timeout(500)
+                return True
             
             # Método 2: Presionar Escape
             self.print_colored("⌨️ Intentando cerrar con tecla Escape", Fore.BLUE)
@@ -1688,45 +2097,34 @@ class LicenciaScraper:
         Returns:
             Acción a realizar ('continue', 'retry', 'retry_without_restart')
         """
-        self.print_colored(f"\n{'⚠️ ERROR EN MONITOREO CONTINUO ⚠️':^60}", Fore.YELLOW, Style.BRIGHT)
-        self.print_colored("=" * 60, Fore.YELLOW)
-        
         # Mostrar información del error
-        self.print_colored(f"📋 Tipo de error: {error_info.get('status', 'Desconocido')}", Fore.YELLOW)
-        self.print_colored(f"📝 Mensaje: {error_info.get('message', 'Sin mensaje')}", Fore.YELLOW)
-        self.print_colored(f"🔗 URL actual: {error_info.get('url', 'Desconocida')}", Fore.YELLOW)
-        
-        if error_info.get('all_errors'):
-            self.print_colored("📄 Errores detectados:", Fore.YELLOW)
-            for i, error in enumerate(error_info['all_errors'], 1):
-                self.print_colored(f"   {i}. {error}", Fore.RED)
-        
-        self.print_colored("=" * 60, Fore.YELLOW)
+        self._print_error_report(error_info, '⚠️ ERROR EN MONITOREO CONTINUO ⚠️', Fore.YELLOW)
         
         # Primero intentar detectar y cerrar modales
         modal_closed = await self._detect_and_close_modals()
         
-        if modal_closed:
-            self.print_colored("🔄 Modal cerrado, reintentando desde estado actual...", Fore.BLUE)
-            self.logger.info("Modal cerrado, reintentando sin reiniciar navegador")
-            return "retry_without_restart"
-        
         # Determinar acción automática basada en el tipo de error
         error_status = error_info.get('status', '')
         
-        if error_status in ['timeout_error', 'estatus_error']:
+        if modal_closed:
+            self.print_colored("🔄 Modal cerrado, reintentando desde estado actual...", Fore.BLUE)
+            self.logger.info("Modal cerrado, reintentando sin reiniciar navegador")
+            action = "retry_without_restart"
+        elif error_status in ['timeout_error', 'estatus_error']:
             self.print_colored("🔄 Reintentando automáticamente debido a error de timeout/estatus...", Fore.BLUE)
             self.logger.info(f"Reintento automático por error: {error_status}")
-            return "retry_without_restart"  # Cambiar para no reiniciar navegador
+            action = "retry_without_restart"  # Cambiar para no reiniciar navegador
         elif error_status in ['no_availability_error', 'no_availability_content']:
             self.print_colored("📝 Continuando monitoreo - sin disponibilidad detectada", Fore.BLUE)
             self.logger.info(f"Continuando monitoreo: {error_status}")
-            return "continue"
+            action = "continue"
         else:
             # Para errores desconocidos, reintentar sin reiniciar navegador
             self.print_colored("🔄 Reintentando automáticamente por error desconocido...", Fore.BLUE)
             self.logger.info(f"Reintento automático por error desconocido: {error_status}")
-            return "retry_without_restart"
+            action = "retry_without_restart"
+            
+        return action
 
     async def handle_error_interactively(self, error_info: Dict[str, Any]) -> str:
         """
@@ -1738,20 +2136,8 @@ class LicenciaScraper:
         Returns:
             Acción elegida por el usuario ('continue', 'retry', 'manual', 'exit')
         """
-        self.print_colored(f"\n{'🚨 ERROR DETECTADO 🚨':^60}", Fore.RED, Style.BRIGHT)
-        self.print_colored("=" * 60, Fore.RED)
-        
         # Mostrar información del error
-        self.print_colored(f"📋 Tipo de error: {error_info.get('status', 'Desconocido')}", Fore.YELLOW)
-        self.print_colored(f"📝 Mensaje: {error_info.get('message', 'Sin mensaje')}", Fore.YELLOW)
-        self.print_colored(f"🔗 URL actual: {error_info.get('url', 'Desconocida')}", Fore.YELLOW)
-        
-        if error_info.get('all_errors'):
-            self.print_colored("📄 Errores detectados:", Fore.YELLOW)
-            for i, error in enumerate(error_info['all_errors'], 1):
-                self.print_colored(f"   {i}. {error}", Fore.RED)
-        
-        self.print_colored("=" * 60, Fore.RED)
+        self._print_error_report(error_info, '🚨 ERROR DETECTADO 🚨', Fore.RED)
         
         # Mantener navegador abierto y preguntar al usuario
         self.print_colored("🔍 NAVEGADOR MANTENIDO ABIERTO para inspección manual", Fore.CYAN, Style.BRIGHT)
@@ -1763,7 +2149,7 @@ class LicenciaScraper:
             self.print_colored("3. 🖱️  Pausa para intervención manual", Fore.BLUE)
             self.print_colored("4. ❌ Salir del programa", Fore.BLUE)
             
-            choice = input("\nSeleccione una opción (1-4): ").strip()
+            choice = (await self._ainput("\nSeleccione una opción (1-4): ")).strip()
             
             if choice == "1":
                 self.print_colored("✅ Continuando monitoreo...", Fore.GREEN)
@@ -1779,6 +2165,47 @@ class LicenciaScraper:
             else:
                 self.print_colored("❌ Opción inválida. Seleccione 1, 2, 3 o 4", Fore.RED)
     
+    async def _ainput(self, prompt: str) -> str:
+        """
+        Lee una línea del usuario en un hilo aparte, sin bloquear el event loop
+        (Playwright sigue atendiendo al navegador mientras se espera la respuesta).
+        El hilo es daemon y no pertenece al executor del loop, así que un input()
+        pendiente no impide que asyncio.run termine al apagar el scraper.
+        
+        Args:
+            prompt: Texto a mostrar
+            
+        Returns:
+            Línea ingresada por el usuario.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        def _resolve(value=None, error=None):
+            # Si la espera se canceló (apagado), la respuesta ya no interesa
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+        
+        def _read():
+            try:
+                line = input(prompt)
+            except BaseException as e:
+                result = (None, e)
+            else:
+                result = (line, None)
+            try:
+                loop.call_soon_threadsafe(_resolve, *result)
+            except RuntimeError:
+                # El loop ya se cerró: el scraper terminó mientras se esperaba la respuesta
+                pass
+        
+        threading.Thread(target=_read, name='scraper-input', daemon=True).start()
+        return await future
+        
     async def _handle_manual_intervention(self) -> str:
         """
         Maneja la intervención manual del usuario.
@@ -1800,7 +2227,7 @@ class LicenciaScraper:
             self.print_colored("3. ⏸️  Mantener pausa (seguir interviniendo)", Fore.BLUE)
             self.print_colored("4. ❌ Salir del programa", Fore.BLUE)
             
-            choice = input("\nSeleccione una opción (1-4): ").strip()
+            choice = (await self._ainput("\nSeleccione una opción (1-4): ")).strip()
             
             if choice == "1":
                 self.print_colored("✅ Continuando desde el estado actual...", Fore.GREEN)
@@ -1810,7 +2237,7 @@ class LicenciaScraper:
                 return "retry"
             elif choice == "3":
                 self.print_colored("⏸️ Manteniendo pausa para más intervención...", Fore.YELLOW)
-                input("\nPresione ENTER cuando termine su intervención...")
+                await self._ainput("\nPresione ENTER cuando termine su intervención...")
                 continue
             elif choice == "4":
                 self.print_colored("✅ Saliendo del programa...", Fore.YELLOW)
@@ -1829,6 +2256,14 @@ async def main():
     
     scraper = LicenciaScraper()
     
+    # Cerrar el navegador de forma ordenada si el proceso recibe SIGTERM
+    main_task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+    except (NotImplementedError, AttributeError):
+        # Windows no soporta add_signal_handler
+        pass
+    
     try:
         # Solicitar información al usuario
         scraper.get_user_input()
@@ -1871,9 +2306,20 @@ async def main():
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}🛑 Programa interrumpido por el usuario{Style.RESET_ALL}")
         
+    except asyncio.CancelledError:
+        # SIGTERM cancela la tarea principal: terminar limpio (el finally cierra todo)
+        # en lugar de dejar que asyncio.run propague la cancelación con traceback
+        print(f"\n{Fore.YELLOW}🛑 Programa detenido por señal de término{Style.RESET_ALL}")
+        
     except Exception as e:
         print(f"{Fore.RED}❌ Error general: {str(e)}{Style.RESET_ALL}")
         logging.error(f"Error general: {str(e)}")
+        
+    finally:
+        try:
+            await scraper.shutdown()
+        except Exception:
+            pass
 
 
 if __name__ == "__main__":
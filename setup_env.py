@@ -3,6 +3,10 @@
 Script para configurar el archivo .env correctamente
 """
 
+import os
+import stat
+import tempfile
+
 env_content = """TARGET_URL=https://tramites.munistgo.cl/reservahoralicencia/
 ERROR_URL_PATTERN=paso-1.aspx?Error=No%20existen%20horas%20disponibles
 RETRY_INTERVAL_MINUTES=30
@@ -10,9 +14,32 @@ RUT_EJEMPLO=25334838-0
 HEADLESS_MODE=False
 BROWSER_TYPE=chromium"""
 
-with open('.env', 'w', encoding='utf-8') as f:
-    f.write(env_content)
+# Si el archivo ya tiene exactamente este contenido, no hace falta reescribirlo
+try:
+    with open('.env', 'rb') as f:
+        existing = f.read()
+        mode = stat.S_IMODE(os.fstat(f.fileno()).st_mode)
+except FileNotFoundError:
+    existing = None
+    # Permisos por defecto de un archivo nuevo según la umask (mkstemp usaría 0600)
+    umask = os.umask(0)
+    os.umask(umask)
+    mode = 0o666 & ~umask
+
+if existing == env_content.encode('utf-8'):
+    print("✅ Archivo .env sin cambios")
+else:
+    # Escribir en un archivo temporal y reemplazar: el .env nunca queda a medio escribir
+    fd, tmp_path = tempfile.mkstemp(dir='.', prefix='.env.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(env_content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, '.env')
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print("✅ Archivo .env creado correctamente")
 
-print("✅ Archivo .env creado correctamente")
 print("Contenido:")
-print(env_content) 
\ No newline at end of file
+print(env_content)